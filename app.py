@@ -1,23 +1,101 @@
+import importlib
+import logging
+import os
+import threading
 import streamlit as st
-import home
-import historique
-import septembre  # Nouveau module pour l'onglet Septembre
+from instrumentation import start_run, run_records, write_metrics
+
+# Pages de l'application et module qui les affiche : chaque module (et ses dépendances pandas, plotly, gdown)
+# n'est importé qu'à la première sélection de la page
+pages = {
+    "Accueil": "home",
+    "Historique": "historique",
+    "Septembre": "septembre",  # Nouveau module pour l'onglet Septembre
+    "Cohortes": "cohorte",
+}
+
+# Préchargement des données en arrière-plan, une seule fois par processus, pendant l'affichage de la page d'accueil
+@st.cache_resource
+def start_prefetch():
+    from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+    def prefetch():
+        try:
+            importlib.import_module('data_processing').prefetch_data()
+        except Exception:
+            # L'erreur est journalisée (la page qui a besoin des données la remontera) et le préchargement sera
+            # relancé à la prochaine exécution de la page d'accueil
+            logging.getLogger('onboarding.prefetch').exception("Échec du préchargement des données")
+            start_prefetch.clear()
+
+    thread = threading.Thread(target=prefetch, name='prefetch-donnees', daemon=True)
+    add_script_run_ctx(thread)
+    thread.start()
+    return thread
 
 # Configuration de la page
 st.set_page_config(page_title="Application Onboarding", page_icon="📊", layout="wide")
+start_run()
 
 # Barre de navigation en haut
 page = st.selectbox(
     "Navigation", 
-    ["Accueil", "Historique", "Septembre"],  # Ajout de "Septembre"
+    list(pages),
     index=0,
     key="navigation"
 )
 
+# Avancement du rafraîchissement lancé par cette session, actualisé chaque seconde sans réexécuter la page ;
+# à la fin, la page est réexécutée avec les nouvelles données
+def refresh_progress():
+    from data_processing import refresh_status
+    status = refresh_status()
+    if status['running']:
+        for output, transfer in status['transfers'].items():
+            if transfer.get('status') != 'en cours':
+                continue
+            done, total = transfer.get('done') or 0, transfer.get('total')
+            text = f"{os.path.basename(output)} : {done / 1e6:.1f} Mo" + (f" / {total / 1e6:.1f} Mo" if total else "")
+            if transfer.get('attempt', 1) > 1:
+                text += f" (tentative {transfer['attempt']})"
+            st.progress(min(done / total, 1.0) if total else 0.0, text=text)
+        st.caption("Les pages affichent les données précédentes jusqu'à la fin du rafraîchissement.")
+    elif status['generation'] != st.session_state.get('refresh_seen'):
+        st.session_state['refresh_seen'] = status['generation']
+        st.session_state['refresh_result'] = status
+        st.rerun()
+
+# Rafraîchissement incrémental des fichiers sources, en arrière-plan
+if st.sidebar.button("Rafraîchir les données"):
+    from data_processing import start_refresh
+    if not start_refresh():
+        st.sidebar.info("Un rafraîchissement est déjà en cours.")
+    st.session_state['refresh_started'] = True
+
+if st.session_state.get('refresh_started'):
+    with st.sidebar:
+        st.fragment(refresh_progress, run_every=1)()
+
+refresh_result = st.session_state.pop('refresh_result', None)
+if refresh_result is not None:
+    st.session_state['refresh_started'] = False
+    if refresh_result['error'] is not None:
+        st.sidebar.error(f"Échec du rafraîchissement : {refresh_result['error']}")
+    elif refresh_result['changed_files']:
+        st.sidebar.success("Fichiers mis à jour : " + ", ".join(refresh_result['changed_files']))
+    else:
+        st.sidebar.info("Les données sont déjà à jour.")
+
+# Panneau de debug : durée, lignes, cache et mémoire de chaque étape de la page
+debug = st.sidebar.checkbox("Mode debug", value=False)
+
 # Rediriger vers la page sélectionnée
-if page == "Accueil":
-    home.main()
-elif page == "Historique":
-    historique.main()
-elif page == "Septembre":
-    septembre.main()
+importlib.import_module(pages[page]).main()
+start_prefetch()
+
+if debug:
+    with st.expander("Debug : mesures par étape", expanded=True):
+        st.dataframe(run_records(), use_container_width=True)
+
+# Totaux par étape pour l'analyse hors ligne (format Prometheus)
+write_metrics()
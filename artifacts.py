@@ -0,0 +1,131 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+import streamlit as st
+
+from data_cache import source_version, read_parquet
+from instrumentation import instrument
+
+# Répertoire des résultats précalculés par precompute.py : un sous-répertoire par version, latest.json pointe sur la dernière
+ARTIFACTS_DIR = os.environ.get('ARTIFACTS_DIR', 'artifacts')
+# Au-delà de cet âge, les résultats précalculés sont considérés comme périmés et les pages recalculent en direct
+MAX_AGE = pd.Timedelta(hours=float(os.environ.get('ARTIFACTS_MAX_AGE_HOURS', 24)))
+SOURCE_PATH = os.path.join('data', 'prepared_data.csv')
+# Version du format des artefacts : les artefacts d'un format antérieur sont ignorés
+ARTIFACTS_FORMAT = 2
+# Durée pendant laquelle le manifeste et les artefacts lus restent en mémoire (une version écrite entre-temps par
+# precompute.py est prise en compte au-delà)
+CACHE_TTL = pd.Timedelta(minutes=float(os.environ.get('ARTIFACTS_CACHE_MINUTES', 5)))
+
+
+# Nom d'artefact des résultats d'une cohorte (mêmes paramètres que cohorte.compute_cohort)
+def cohort_artifact_name(start_month, end_month, country, baseline_start, baseline_end, baseline_country=None):
+    return '_'.join(['cohort', start_month, end_month, country, baseline_start, baseline_end, baseline_country or 'all'])
+
+
+# Manifeste de la dernière version des artefacts (None s'il n'y en a pas)
+def latest_manifest():
+    latest_path = os.path.join(ARTIFACTS_DIR, 'latest.json')
+    if not os.path.exists(latest_path):
+        return None
+    with open(latest_path) as f:
+        version = json.load(f)['version']
+    manifest_path = os.path.join(ARTIFACTS_DIR, version, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+# Les artefacts sont à jour s'ils ont été calculés sur la version actuelle du fichier source et sont assez récents
+def is_fresh(manifest, source_digest):
+    if manifest.get('format') != ARTIFACTS_FORMAT:
+        return False
+    if pd.Timestamp.now() - pd.Timestamp(manifest['generated_at']) > MAX_AGE:
+        return False
+    if source_digest is not None and source_digest != manifest['source_digest']:
+        return False
+    return True
+
+
+# Manifeste des artefacts à jour pour une version du fichier source (None s'il n'y en a pas), relu au plus une fois
+# par CACHE_TTL
+@instrument(cache=st.cache_resource(ttl=CACHE_TTL))
+def fresh_manifest(source_digest):
+    manifest = latest_manifest()
+    if manifest is None or not is_fresh(manifest, source_digest):
+        return None
+    return manifest
+
+
+# Lecture d'un artefact à jour, mise en cache sur (version du fichier source, nom) et partagée entre les sessions
+# (à ne pas modifier) : la page ne relit ni le manifeste ni les fichiers à chaque exécution
+@instrument(cache=st.cache_resource(ttl=CACHE_TTL))
+def read_artifact(source_digest, name):
+    manifest = fresh_manifest(source_digest)
+    if manifest is None or name not in manifest['artifacts']:
+        return None
+
+    version_dir = os.path.join(ARTIFACTS_DIR, manifest['version'])
+    entry = manifest['artifacts'][name]
+    if entry['type'] == 'figure':
+        import plotly.io as pio
+        with open(os.path.join(version_dir, entry['file'])) as f:
+            return pio.from_json(f.read())
+    if entry['type'] == 'frames':
+        return {key: read_parquet(os.path.join(version_dir, file)) for key, file in entry['files'].items()}
+    return read_parquet(os.path.join(version_dir, entry['file']))
+
+
+# Charger un artefact (DataFrame, dictionnaire de DataFrames ou figure Plotly) s'il est à jour, sinon None
+def load_artifact(name):
+    return read_artifact(source_version(SOURCE_PATH), name)
+
+
+# Date de calcul des artefacts à jour (None s'il n'y en a pas)
+def artifacts_generated_at():
+    manifest = fresh_manifest(source_version(SOURCE_PATH))
+    if manifest is None:
+        return None
+    return pd.Timestamp(manifest['generated_at'])
+
+
+# Écrire une nouvelle version des artefacts puis basculer latest.json dessus ; seules les keep dernières versions sont gardées
+def write_artifacts(artifacts, source_digest, keep=3):
+    generated_at = pd.Timestamp.now()
+    version = f"{generated_at:%Y%m%d-%H%M%S}-{source_digest[:12]}"
+    version_dir = os.path.join(ARTIFACTS_DIR, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    entries = {}
+    for name, value in artifacts.items():
+        if isinstance(value, pd.DataFrame):
+            value.to_parquet(os.path.join(version_dir, f'{name}.parquet'), index=False)
+            entries[name] = {'type': 'frame', 'file': f'{name}.parquet'}
+        elif isinstance(value, dict):
+            files = {}
+            for key, frame in value.items():
+                files[key] = f'{name}-{key}.parquet'
+                frame.to_parquet(os.path.join(version_dir, files[key]), index=False)
+            entries[name] = {'type': 'frames', 'files': files}
+        else:
+            with open(os.path.join(version_dir, f'{name}.json'), 'w') as f:
+                f.write(value.to_json())
+            entries[name] = {'type': 'figure', 'file': f'{name}.json'}
+
+    manifest = {'version': version, 'format': ARTIFACTS_FORMAT, 'generated_at': generated_at.isoformat(), 'source_digest': source_digest, 'artifacts': entries}
+    with open(os.path.join(version_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    tmp_path = os.path.join(ARTIFACTS_DIR, 'latest.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': version}, f)
+    os.replace(tmp_path, os.path.join(ARTIFACTS_DIR, 'latest.json'))
+
+    versions = sorted(entry for entry in os.listdir(ARTIFACTS_DIR) if os.path.isdir(os.path.join(ARTIFACTS_DIR, entry)))
+    for old_version in versions[:-keep]:
+        shutil.rmtree(os.path.join(ARTIFACTS_DIR, old_version))
+
+    return version
@@ -0,0 +1,169 @@
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cohorts import cohort_keys, aggregate_columns, build_cohort_clients, build_cohort_clients_from_aggregates
+from survival import survival_table, kaplan_meier
+
+# Colonnes des commandes utiles au calcul des courbes (les seules écrites dans le segment partagé)
+batch_columns = ['Restaurant ID', 'Pays', 'Date de commande', 'date 1ere commande (Restaurant)']
+# Une ligne par (pays, mois de première commande, jours observés, deuxième commande) avec son nombre de clients
+survival_keys = cohort_keys + ['Jours observés', '2e commande']
+# Colonnes des courbes produites par run_batch et leurs types
+curve_dtypes = {
+    'Pays': 'string',
+    'Mois 1ère commande': 'period[M]',
+    'Clients mono-achat': 'int64',
+    'Clients multi-achats': 'int64',
+    'Jours jusqu\'à la 2e commande': 'int64',
+    'Clients observés': 'int64',
+    'Clients passés à la 2e commande': 'int64',
+    '% passés à la 2e commande': 'float64',
+}
+
+
+# Clé de partition de chaque commande : le pays, ou un hachage de l'identifiant client réparti sur n partitions
+def partition_keys(df, partition='country', partitions=None):
+    if partition == 'country':
+        return df['Pays'].astype('string').fillna('').to_numpy()
+    partitions = partitions or os.cpu_count() or 1
+    return pd.util.hash_array(df['Restaurant ID'].astype('string').fillna('').to_numpy()) % partitions
+
+
+# Écrire les commandes, triées par partition, dans un segment de mémoire partagée au format Arrow IPC
+# Retourne le segment et les bornes (début, fin) de chaque partition
+def share_partitions(df, keys):
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    _, starts = np.unique(sorted_keys, return_index=True)
+    stops = np.append(starts[1:], len(sorted_keys))
+
+    table = pa.Table.from_pandas(df.iloc[order], preserve_index=False)
+
+    # Taille du fichier IPC, puis écriture directement dans le segment partagé (sans copie intermédiaire)
+    size_counter = pa.MockOutputStream()
+    write_ipc(table, size_counter)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, size_counter.size()))
+    buffer = pa.py_buffer(shm.buf)
+    write_ipc(table, pa.FixedSizeBufferWriter(buffer))
+    del buffer
+
+    return shm, list(zip(starts.tolist(), stops.tolist()))
+
+
+def write_ipc(table, sink):
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+# Calcul d'une partition dans un processus du pool : lecture sans copie du segment partagé, puis nombre de clients
+# par cohorte et par durée d'observation (jusqu'à la deuxième commande, ou jusqu'à cutoff pour les clients censurés)
+# La partition contient des commandes, ou des agrégats par client en mode streaming (from_aggregates)
+def compute_partition(shm_name, start, stop, cutoff, from_aggregates=False):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffer = pa.py_buffer(shm.buf)
+    table = pa.ipc.open_file(buffer).read_all().slice(start, stop - start)
+    if from_aggregates:
+        clients = build_cohort_clients_from_aggregates(table.to_pandas())
+    else:
+        clients = build_cohort_clients(table.to_pandas())
+
+    survival = pd.concat([clients[cohort_keys].reset_index(drop=True), survival_table(clients, cutoff)], axis=1)
+    counts = survival.groupby(survival_keys, observed=True).size().rename('Clients').reset_index()
+
+    # Libérer les vues sur le segment (les colonnes lues sans copie en font partie) avant de le fermer
+    del table, buffer, clients, survival
+    shm.close()
+    return counts
+
+
+# Courbes de Kaplan–Meier par cohorte au format long : une ligne par (pays, mois de première commande, jour avec au
+# moins une deuxième commande), avec les compteurs mono/multi de la cohorte et la part cumulée de clients passés
+# à la deuxième commande ; les clients mono-achat sont censurés à la fin des données
+def cohort_curves(counts):
+    cohorts = counts.groupby(cohort_keys, sort=True)
+    groups = cohorts.ngroup()
+    curves = kaplan_meier(counts['Jours observés'], counts['2e commande'], groups, weights=counts['Clients'])
+
+    multi = counts['Clients'].where(counts['2e commande'], 0)
+    totals = pd.DataFrame({
+        'Clients mono-achat': (counts['Clients'] - multi).groupby(groups).sum(),
+        'Clients multi-achats': multi.groupby(groups).sum(),
+    })
+    keys = cohorts.size().reset_index()[cohort_keys]
+    curves = pd.concat([keys.iloc[curves['Groupe']].reset_index(drop=True), totals.loc[curves['Groupe']].reset_index(drop=True),
+                        curves.drop(columns='Groupe')], axis=1)
+    return curves.rename(columns={'Jours': 'Jours jusqu\'à la 2e commande'}).sort_values(
+        cohort_keys + ['Jours jusqu\'à la 2e commande'], ignore_index=True)
+
+
+# Courbes sans aucune cohorte, avec les colonnes et les types de run_batch
+def empty_curves():
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in curve_dtypes.items()})
+
+
+# Calculer les courbes de tous les pays et de tous les mois en parallèle, une partition par processus, à partir des
+# commandes ou des agrégats par client du mode streaming (from_aggregates : l'historique n'est jamais chargé en entier)
+def run_batch(df, partition='country', partitions=None, workers=None, from_aggregates=False):
+    # Fin des données commune à toutes les partitions
+    if from_aggregates:
+        cutoff = df['Dernière commande'].max()
+        df = df[aggregate_columns]
+    else:
+        cutoff = df['Date de commande'].max()
+        df = df[batch_columns]
+    # Rien à calculer : courbes vides, sans démarrer de processus
+    if df.empty:
+        return empty_curves()
+
+    keys = partition_keys(df, partition, partitions)
+    shm, bounds = share_partitions(df, keys)
+    try:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(compute_partition, [shm.name] * len(bounds),
+                                    [start for start, _ in bounds], [stop for _, stop in bounds], [cutoff] * len(bounds),
+                                    [from_aggregates] * len(bounds)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Avec un partitionnement par hachage, une même cohorte peut être répartie sur plusieurs partitions
+    counts = pd.concat(results, ignore_index=True)
+    if counts.empty:
+        return empty_curves()
+    counts['Pays'] = counts['Pays'].astype('string')
+    counts = counts.groupby(survival_keys, sort=True)['Clients'].sum().reset_index()
+
+    return cohort_curves(counts)
+
+
+def main():
+    import logging
+    import streamlit.logger
+    streamlit.logger.set_log_level(logging.ERROR)
+    from data_processing import load_prepared_data, load_client_aggregates, ingestion_mode
+
+    parser = argparse.ArgumentParser(description="Courbes mono/multi-achats et temps jusqu'à la 2e commande pour tous les pays et toutes les cohortes")
+    parser.add_argument('--partition', choices=['country', 'hash'], default='country', help="Partitionnement : par pays ou par hachage de l'identifiant client")
+    parser.add_argument('--partitions', type=int, help="Nombre de partitions pour le partitionnement par hachage (par défaut : nombre de cœurs)")
+    parser.add_argument('--workers', type=int, help="Nombre de processus (par défaut : nombre de cœurs)")
+    parser.add_argument('--output', default=os.path.join('data', 'cohort_curves.csv'))
+    args = parser.parse_args()
+
+    if ingestion_mode == 'streaming':
+        curves = run_batch(load_client_aggregates(), args.partition, args.partitions, args.workers, from_aggregates=True)
+    else:
+        curves = run_batch(load_prepared_data(), args.partition, args.partitions, args.workers)
+    curves.to_csv(args.output, index=False)
+    print(f"{len(curves)} lignes écrites dans {args.output}")
+
+
+if __name__ == '__main__':
+    main()
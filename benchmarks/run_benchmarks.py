@@ -0,0 +1,158 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import streamlit.logger
+
+# Exécution sans serveur Streamlit : les caches fonctionnent en mémoire, on masque les avertissements "bare mode"
+streamlit.logger.set_log_level(logging.ERROR)
+
+from benchmarks.synthetic_data import write_inputs
+from data_cache import CACHE_DIR
+from data_processing import load_prepared_data, load_prepared_frame
+import plot_data
+from plot_data import load_second_order_clients, plot_mono_vs_multi_order, plot_second_order_curve
+from survival import second_order_curves
+from cohorts import build_cohort_table
+from cohorte import build_cohort
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+# Nombre de lignes d'un résultat (None si ce n'est pas un DataFrame)
+def row_count(result):
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(len(value) for value in result.values() if isinstance(value, pd.DataFrame))
+    return None
+
+
+# Mesurer une étape : durée sur une première exécution, puis pic mémoire (tracemalloc) sur une seconde exécution
+def measure(run, setup=None, rows_in=None, memory=True):
+    if setup is not None:
+        setup()
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+
+    measurement = {'seconds': round(seconds, 4), 'rows_in': rows_in, 'rows_out': row_count(result)}
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        run()
+        measurement['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    return result, measurement
+
+
+# Supprimer le cache Parquet et le DataFrame partagé pour mesurer un démarrage à froid
+def clear_caches(parquet=True):
+    load_prepared_frame.clear()
+    if parquet and os.path.isdir(CACHE_DIR):
+        shutil.rmtree(CACHE_DIR)
+
+
+# Vider les figures mémoïsées : chaque exécution d'une étape de tracé construit sa figure (pas de lecture en cache)
+def clear_figure_cache():
+    with plot_data._figure_cache_lock:
+        plot_data._figure_cache.clear()
+
+
+# Chronométrer chaque étape des pages sur un historique synthétique de n_rows commandes
+def benchmark_size(n_rows, work_dir, memory=True, **generator_kwargs):
+    write_inputs(os.path.join(work_dir, 'data'), n_rows, **generator_kwargs)
+    stages = {}
+
+    _, stages['load_prepared_data (csv -> parquet)'] = measure(
+        load_prepared_data, setup=clear_caches, rows_in=n_rows, memory=memory)
+    df, stages['load_prepared_data (parquet)'] = measure(
+        load_prepared_data, setup=lambda: clear_caches(parquet=False), rows_in=n_rows, memory=memory)
+
+    cohorts, stages['build_cohort_table'] = measure(lambda: build_cohort_table(df), rows_in=len(df), memory=memory)
+    _, stages['plot_mono_vs_multi_order'] = measure(
+        lambda: plot_mono_vs_multi_order(cohorts), setup=clear_figure_cache, rows_in=len(cohorts), memory=memory)
+    second_order_clients, stages['load_second_order_clients'] = measure(
+        lambda: load_second_order_clients(df), rows_in=len(df), memory=memory)
+    curves, stages['second_order_curves'] = measure(
+        lambda: second_order_curves({"Base historique": second_order_clients}), rows_in=len(second_order_clients), memory=memory)
+    _, stages['plot_second_order_curve'] = measure(
+        lambda: plot_second_order_curve(curves), setup=clear_figure_cache, rows_in=len(curves), memory=memory)
+
+    # Calculs de la page Septembre, hors cache Streamlit
+    cohort, stages['compute_cohort (septembre)'] = measure(
+        lambda: build_cohort('2024-09', '2024-09', 'FR', '2024-01-01', '2024-06-30'),
+        rows_in=len(df), memory=memory)
+
+    return stages
+
+
+# Comparer les durées à une référence et lister les étapes plus lentes que tolerance × référence
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for size, stages in results['sizes'].items():
+        for stage, measurement in stages.items():
+            reference = baseline.get('sizes', {}).get(size, {}).get(stage)
+            if reference and measurement['seconds'] > reference['seconds'] * tolerance:
+                regressions.append(f"{size} lignes - {stage} : {measurement['seconds']:.3f}s (référence {reference['seconds']:.3f}s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des étapes de calcul des pages sur des données synthétiques")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_SIZES, help="Tailles d'historique (nombre de commandes)")
+    parser.add_argument('--orders-per-client', type=float, default=4.0)
+    parser.add_argument('--countries', nargs='+', default=['FR', 'BE', 'ES', 'IT'])
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--end', default='2024-12-31')
+    parser.add_argument('--no-memory', action='store_true', help="Ne pas mesurer le pic mémoire (deux fois plus rapide)")
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'baseline.json'))
+    parser.add_argument('--compare', help="Fichier JSON de référence à comparer")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="Ralentissement toléré par rapport à la référence")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    results = {'generated_at': pd.Timestamp.now().isoformat(timespec='seconds'), 'sizes': {}}
+
+    # Les chemins de l'application sont relatifs ('data/...') : on travaille dans un répertoire temporaire
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            for n_rows in args.rows:
+                stages = benchmark_size(n_rows, work_dir, memory=not args.no_memory,
+                                        orders_per_client=args.orders_per_client, countries=tuple(args.countries),
+                                        start=args.start, end=args.end)
+                results['sizes'][str(n_rows)] = stages
+                for stage, measurement in stages.items():
+                    print(f"{n_rows:>10} {stage:<40} {measurement['seconds']:>8.3f}s {measurement.get('peak_mb', '')}")
+        finally:
+            clear_caches()
+            os.chdir(cwd)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Régression : {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic_data import write_inputs
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Script exécuté dans un processus neuf : temps jusqu'au premier rendu de la page d'accueil.
+# En mode "eager", les modules des pages sont importés avant le rendu, comme avant le chargement paresseux.
+MEASURE_SCRIPT = """
+import logging, sys, time
+sys.path.insert(0, {repo_dir!r})
+import streamlit.logger
+streamlit.logger.set_log_level(logging.ERROR)
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+if {eager!r}:
+    import home, historique, septembre, cohorte
+at = AppTest.from_file({app_path!r}, default_timeout=120).run()
+elapsed = time.perf_counter() - start
+assert not at.exception, at.exception
+print(elapsed)
+"""
+
+
+# Mesurer le temps jusqu'au premier rendu dans un processus neuf (médiane de plusieurs exécutions)
+def time_to_first_render(work_dir, eager=False, repeat=5):
+    script = MEASURE_SCRIPT.format(repo_dir=REPO_DIR, eager=eager, app_path=os.path.join(REPO_DIR, 'app.py'))
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], cwd=work_dir, capture_output=True, text=True, check=True)
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(timings), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps jusqu'au premier rendu de l'application (page d'accueil)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Données locales pour que le préchargement en arrière-plan ne télécharge rien
+        write_inputs(os.path.join(work_dir, 'data'), 10_000)
+        results = {
+            'lazy_seconds': time_to_first_render(work_dir, eager=False, repeat=args.repeat),
+            'eager_seconds': time_to_first_render(work_dir, eager=True, repeat=args.repeat),
+        }
+
+    print(f"Premier rendu (pages chargées à la demande) : {results['lazy_seconds']:.3f}s")
+    print(f"Premier rendu (toutes les pages importées)  : {results['eager_seconds']:.3f}s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
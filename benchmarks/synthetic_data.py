@@ -0,0 +1,88 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# Nombre maximal de lignes d'une feuille Excel (hors en-tête)
+EXCEL_MAX_ROWS = 1_048_575
+
+
+# Générer un historique de commandes synthétique au format de prepared_data.csv
+# n_rows : nombre de commandes, orders_per_client : nombre moyen de commandes par client,
+# mono_share : part des clients n'ayant passé qu'une seule commande
+def generate_orders(n_rows, orders_per_client=4.0, countries=('FR', 'BE', 'ES', 'IT'),
+                    start='2024-01-01', end='2024-12-31', mono_share=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    n_clients = max(1, min(n_rows, int(n_rows / orders_per_client)))
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    span_days = max(1, (end - start).days)
+
+    # Chaque client a une première commande ; les commandes suivantes sont réparties entre les clients multi-achats
+    multi_clients = np.flatnonzero(rng.random(n_clients) >= mono_share)
+    if len(multi_clients) == 0:
+        multi_clients = np.arange(n_clients)
+    extra_orders = n_rows - n_clients
+    client_of_row = np.concatenate([np.arange(n_clients), rng.choice(multi_clients, extra_orders)])
+
+    # Date de première commande, puis écarts exponentiels (en jours) pour les commandes suivantes
+    first_day = rng.integers(0, span_days, n_clients)
+    gaps = rng.exponential(scale=20, size=n_rows).astype('int64') + 1
+    gaps[:n_clients] = 0
+    order_day = np.minimum(first_day[client_of_row] + gaps, span_days)
+    order_time = pd.to_timedelta(order_day, unit='D') + pd.to_timedelta(rng.integers(8, 23, n_rows), unit='h')
+
+    # Pays majoritairement français, comme dans les données réelles
+    weights = np.array([3.0] + [1.0] * (len(countries) - 1))
+    client_country = rng.choice(np.array(countries), n_clients, p=weights / weights.sum())
+    client_ids = np.char.add('R', np.arange(n_clients).astype(str))
+
+    df = pd.DataFrame({
+        'Restaurant ID': client_ids[client_of_row],
+        'Restaurant': np.char.add('Restaurant ', np.arange(n_clients).astype(str))[client_of_row],
+        'Postal code': np.char.zfill((rng.integers(1000, 96000, n_clients)).astype(str), 5)[client_of_row],
+        'Pays': client_country[client_of_row],
+        'Date de commande': start + order_time,
+        'date 1ere commande (Restaurant)': (start + pd.to_timedelta(first_day, unit='D'))[client_of_row],
+    })
+
+    return df.sort_values('Date de commande', ignore_index=True)
+
+
+# Générer le classeur Google Sheets associé : une ligne par client avec un responsable commercial et un segment
+def generate_google_sheets(orders, seed=0):
+    rng = np.random.default_rng(seed)
+    client_ids = orders['Restaurant ID'].drop_duplicates().to_numpy()[:EXCEL_MAX_ROWS]
+    return pd.DataFrame({
+        'Restaurant ID': client_ids,
+        'Sales owner': rng.choice(['Alice', 'Bastien', 'Chloé', 'David'], len(client_ids)),
+        'Segment': rng.choice(['Restaurant', 'Traiteur', 'Hôtel'], len(client_ids)),
+    })
+
+
+# Écrire les fichiers d'entrée de l'application (prepared_data.csv et google_sheets_data.xlsx) dans data_dir
+def write_inputs(data_dir, n_rows, **kwargs):
+    os.makedirs(data_dir, exist_ok=True)
+    orders = generate_orders(n_rows, **kwargs)
+    orders.to_csv(os.path.join(data_dir, 'prepared_data.csv'), index=False)
+    generate_google_sheets(orders, seed=kwargs.get('seed', 0)).to_excel(
+        os.path.join(data_dir, 'google_sheets_data.xlsx'), index=False, engine='openpyxl')
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Générer des données synthétiques au format de l'application")
+    parser.add_argument('--rows', type=int, default=100_000, help="Nombre de commandes")
+    parser.add_argument('--orders-per-client', type=float, default=4.0)
+    parser.add_argument('--countries', nargs='+', default=['FR', 'BE', 'ES', 'IT'])
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--end', default='2024-12-31')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='data')
+    args = parser.parse_args()
+
+    write_inputs(args.output_dir, args.rows, orders_per_client=args.orders_per_client, countries=tuple(args.countries),
+                 start=args.start, end=args.end, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
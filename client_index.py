@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+
+# Jours de commande de chaque client (nombre de commandes par jour), triés par client puis par date,
+# à partir d'un itérable de blocs de commandes (un seul DataFrame en mémoire, ou les blocs du mode streaming)
+def build_order_days(chunks):
+    counts = []
+    for chunk in chunks:
+        days = pd.DataFrame({
+            'Restaurant ID': chunk['Restaurant ID'].astype('string'),
+            'Jour de commande': pd.to_datetime(chunk['Date de commande'], errors='coerce').dt.normalize()
+        }).dropna()
+        counts.append(days.groupby(['Restaurant ID', 'Jour de commande']).size())
+
+    if not counts:
+        return pd.DataFrame({'Restaurant ID': pd.Series(dtype='string'), 'Jour de commande': pd.Series(dtype='datetime64[ns]'),
+                             'Commandes': pd.Series(dtype='int64')})
+
+    # Un même jour peut être réparti sur plusieurs blocs
+    order_days = pd.concat(counts).groupby(level=[0, 1]).sum().rename('Commandes').reset_index()
+    return order_days.sort_values(['Restaurant ID', 'Jour de commande'], kind='stable', ignore_index=True)
+
+
+# Index construit une fois par version des données : identifiants clients triés et décalage de la première ligne
+# de chaque client, la ligne suivant la dernière étant le décalage du client suivant
+def build_client_index(order_days):
+    restaurant_ids = order_days['Restaurant ID'].to_numpy(dtype=object)
+    starts = np.flatnonzero(np.r_[True, restaurant_ids[1:] != restaurant_ids[:-1]]) if len(restaurant_ids) else np.empty(0, dtype='int64')
+
+    return {
+        'order_days': order_days,
+        'clients': restaurant_ids[starts],
+        'offsets': np.append(starts, len(restaurant_ids)),
+    }
+
+
+# Position d'un client dans l'index par recherche dichotomique (None s'il n'a aucune commande)
+def client_position(index, restaurant_id):
+    clients = index['clients']
+    position = np.searchsorted(clients, str(restaurant_id))
+    if position == len(clients) or clients[position] != str(restaurant_id):
+        return None
+    return position
+
+
+# Jours de commande d'un client lus dans l'index (sans parcourir la table des commandes),
+# avec l'écart en jours depuis le jour de commande précédent
+def client_orders(index, restaurant_id):
+    position = client_position(index, restaurant_id)
+    if position is None:
+        orders = index['order_days'].iloc[0:0]
+    else:
+        orders = index['order_days'].iloc[index['offsets'][position]:index['offsets'][position + 1]]
+
+    orders = orders[['Jour de commande', 'Commandes']].reset_index(drop=True)
+    orders['Jours depuis commande précédente'] = orders['Jour de commande'].diff().dt.days
+    return orders
@@ -0,0 +1,275 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from data_processing import load_prepared_data, load_client_aggregates, load_client_index, load_client_attributes, ingestion_mode
+from plot_data import plot_second_order_curve, fingerprint
+from survival import survival_table, second_order_curves
+from order_days import build_client_order_table
+from client_index import client_orders, client_position
+from enrichment import enrich_clients, split_columns
+from seniority import seniority_labels, cohort_seniority_stats
+from instrumentation import instrument
+from artifacts import load_artifact, cohort_artifact_name
+
+# Nombre maximal de restaurants proposés par la recherche de l'historique d'un client
+MAX_MATCHES = 20
+
+mois_fr = ['janvier', 'février', 'mars', 'avril', 'mai', 'juin', 'juillet', 'août', 'septembre', 'octobre', 'novembre', 'décembre']
+
+
+# Libellé d'une cohorte en français, par ex. "septembre 2024" ou "janvier 2024 - mars 2024"
+def cohort_label(start_month, end_month):
+    start, end = pd.Period(start_month, freq='M'), pd.Period(end_month, freq='M')
+    start_label = f"{mois_fr[start.month - 1]} {start.year}"
+    if start == end:
+        return start_label
+    return f"{start_label} - {mois_fr[end.month - 1]} {end.year}"
+
+
+# Courbes de passage à la deuxième commande de la base historique et de la cohorte, avec censure à la fin des données
+def cohort_second_order_curves(base_table, cohort_table, cutoff, start_month, end_month):
+    return second_order_curves({
+        "Base historique": survival_table(base_table, cutoff),
+        f"Cohorte {cohort_label(start_month, end_month)}": survival_table(cohort_table, cutoff),
+    })
+
+
+# Calcul mémoïsé d'une cohorte : mis en cache sur ses paramètres, changer de cohorte et revenir est instantané
+# La version ('version') est l'empreinte de la table des clients, calculée une fois avec elle
+@instrument(cache=st.cache_data)
+def compute_cohort(start_month, end_month, country, baseline_start, baseline_end, baseline_country=None):
+    # Résultat précalculé par precompute.py s'il est à jour
+    cohort = load_artifact(cohort_artifact_name(start_month, end_month, country, baseline_start, baseline_end, baseline_country))
+    if cohort is None:
+        cohort = build_cohort(start_month, end_month, country, baseline_start, baseline_end, baseline_country)
+    return {**cohort, 'version': fingerprint(cohort['clients'])}
+
+
+# Calcul d'une cohorte à partir des données (utilisé aussi par precompute.py)
+def build_cohort(start_month, end_month, country, baseline_start, baseline_end, baseline_country=None):
+    if ingestion_mode == 'streaming':
+        return compute_cohort_from_aggregates(start_month, end_month, country, baseline_start, baseline_end, baseline_country)
+
+    df = load_prepared_data(['Restaurant ID', 'Restaurant', 'Postal code', 'Pays', 'Date de commande', 'date 1ere commande (Restaurant)'])
+    first_order_dates = df['date 1ere commande (Restaurant)']
+
+    # Commandes des clients du pays ayant passé leur première commande pendant la période de la cohorte
+    cohort_orders = df[(first_order_dates >= pd.Period(start_month, freq='M').start_time) &
+                       (first_order_dates <= pd.Period(end_month, freq='M').end_time) &
+                       (df['Pays'] == country)]
+
+    # Une ligne par client de la cohorte, avec son nombre de jours de commande (mono-achat / multi-achat)
+    cohort_order_table = build_client_order_table(cohort_orders)
+    cohort_clients = cohort_orders.groupby('Restaurant ID', observed=True)[['Restaurant', 'Postal code', 'date 1ere commande (Restaurant)']].first().reset_index()
+    cohort_clients = cohort_clients.merge(cohort_order_table[['Restaurant ID', 'Jours avec commande']], on='Restaurant ID', how='left')
+
+    # Base historique : clients ayant passé leur première commande pendant la fenêtre de référence
+    base_clients = df[(first_order_dates >= pd.Timestamp(baseline_start)) &
+                      (first_order_dates <= pd.Timestamp(baseline_end))]
+    if baseline_country is not None:
+        base_clients = base_clients[base_clients['Pays'] == baseline_country]
+
+    return {
+        'clients': cohort_clients,
+        'second_order_curves': cohort_second_order_curves(build_client_order_table(base_clients), cohort_order_table,
+                                                          df['Date de commande'].max(), start_month, end_month),
+    }
+
+
+# Même calcul à partir des agrégats par client du mode streaming (sans relire les commandes)
+def compute_cohort_from_aggregates(start_month, end_month, country, baseline_start, baseline_end, baseline_country=None):
+    aggregates = load_client_aggregates()
+    first_order_dates = aggregates['date 1ere commande (Restaurant)']
+
+    cohort_clients = aggregates[(first_order_dates >= pd.Period(start_month, freq='M').start_time) &
+                                (first_order_dates <= pd.Period(end_month, freq='M').end_time) &
+                                (aggregates['Pays'] == country)]
+
+    base_clients = aggregates[(first_order_dates >= pd.Timestamp(baseline_start)) &
+                              (first_order_dates <= pd.Timestamp(baseline_end))]
+    if baseline_country is not None:
+        base_clients = base_clients[base_clients['Pays'] == baseline_country]
+
+    return {
+        'clients': cohort_clients[['Restaurant ID', 'Restaurant', 'Postal code', 'date 1ere commande (Restaurant)', 'Jours avec commande']].reset_index(drop=True),
+        'second_order_curves': cohort_second_order_curves(base_clients, cohort_clients, aggregates['Dernière commande'].max(),
+                                                          start_month, end_month),
+    }
+
+
+# Afficher un tableau trié et paginé côté serveur : seule la page courante est envoyée au navigateur
+def paginated_dataframe(df, key, page_sizes=(25, 50, 100, 250)):
+    col1, col2, col3, col4 = st.columns(4)
+    sort_column = col1.selectbox("Trier par", list(df.columns), key=f'{key}_sort')
+    ascending = col2.selectbox("Ordre", ["Croissant", "Décroissant"], key=f'{key}_order') == "Croissant"
+    page_size = col3.selectbox("Lignes par page", page_sizes, key=f'{key}_page_size')
+    page_count = max(1, -(-len(df) // page_size))
+    page = col4.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, value=1, key=f'{key}_page')
+
+    start = (page - 1) * page_size
+    sorted_df = df.sort_values(sort_column, ascending=ascending, kind='stable')
+    st.dataframe(sorted_df.iloc[start:start + page_size], use_container_width=True)
+    st.caption(f"{len(df)} lignes")
+
+
+# Afficher l'historique d'un client de la cohorte (jours de commande, écarts, code postal), lu dans l'index des commandes
+# Le client est recherché par identifiant exact ou par nom : seuls quelques résultats sont envoyés au navigateur
+def render_client_drill_down(clients):
+    query = st.text_input("Rechercher un restaurant (identifiant ou nom)", key='drill_down_query').strip()
+    if not query:
+        return
+
+    index = load_client_index()
+    restaurant_ids = clients['Restaurant ID'].astype('string')
+    matches = clients.iloc[0:0]
+    if client_position(index, query) is not None:
+        matches = clients[(restaurant_ids == query).to_numpy()]
+    if matches.empty:
+        matches = clients[clients['Restaurant'].astype('string').str.contains(query, case=False, regex=False, na=False).to_numpy()]
+    if matches.empty:
+        st.info("Aucun restaurant de la cohorte ne correspond à la recherche.")
+        return
+    if len(matches) > MAX_MATCHES:
+        st.caption(f"{len(matches)} restaurants correspondent : seuls les {MAX_MATCHES} premiers sont proposés, précisez la recherche.")
+
+    matches = matches.sort_values('Restaurant', kind='stable').head(MAX_MATCHES)
+    matches.index = matches['Restaurant ID'].astype(str)
+    names = matches['Restaurant'].astype(str)
+    restaurant_id = st.selectbox("Restaurant", list(matches.index), format_func=lambda rid: f"{names[rid]} ({rid})", key='drill_down_client')
+    if restaurant_id is None:
+        return
+
+    orders = client_orders(index, restaurant_id)
+    col1, col2, col3 = st.columns(3)
+    col1.metric(label="Code postal", value=str(matches.loc[restaurant_id, 'Postal code']))
+    col2.metric(label="Jours avec commande", value=len(orders))
+    mean_gap = orders['Jours depuis commande précédente'].mean()
+    col3.metric(label="Écart moyen entre commandes", value=f"{mean_gap:.1f} jours" if pd.notna(mean_gap) else "-")
+
+    fig = px.bar(orders, x='Jour de commande', y='Commandes', title=f"Commandes de {names[restaurant_id]}")
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(orders, use_container_width=True)
+
+
+# Afficher la vue d'une cohorte (acquisitions, temps jusqu'à la deuxième commande, ancienneté, clients mono-order)
+@instrument()
+def render_cohort(start_month, end_month, country, baseline_start, baseline_end, baseline_country=None):
+    label = cohort_label(start_month, end_month)
+    # Date de référence commune de l'ancienneté (groupes et tableau des clients mono-order)
+    today = pd.Timestamp.today().normalize()
+    cohort = compute_cohort(start_month, end_month, country, baseline_start, baseline_end, baseline_country)
+    cohort_clients = cohort['clients']
+
+    mono_order_clients = len(cohort_clients[cohort_clients['Jours avec commande'] == 1])
+    multi_order_clients = len(cohort_clients[cohort_clients['Jours avec commande'] > 1])
+    total_clients = mono_order_clients + multi_order_clients
+    percent_mono_order = (mono_order_clients / total_clients) * 100 if total_clients > 0 else 0
+
+    # Répartition optionnelle par un attribut du classeur Google Sheets (commercial, segment, ...)
+    attributes = load_client_attributes()
+    split = st.selectbox("Répartir par", ["Aucune répartition"] + split_columns(attributes), key='cohort_split')
+
+    # Créer un DataFrame pour le graphique empilé
+    if split == "Aucune répartition":
+        stacked_data = pd.DataFrame({
+            'Type de client': ['Mono-order', 'Multi-order'],
+            'Nombre de clients': [mono_order_clients, multi_order_clients]
+        })
+    else:
+        enriched_clients = enrich_clients(cohort_clients[cohort_clients['Jours avec commande'] >= 1], attributes)
+        enriched_clients['Type de client'] = enriched_clients['Jours avec commande'].gt(1).map({False: 'Mono-order', True: 'Multi-order'})
+        enriched_clients[split] = enriched_clients[split].astype('string').fillna("Non renseigné")
+        stacked_data = enriched_clients.groupby(['Type de client', split]).size().rename('Nombre de clients').reset_index()
+
+    # Graphique empilé des acquisitions
+    fig = px.bar(stacked_data,
+                 x='Type de client',
+                 y='Nombre de clients',
+                 color=None if split == "Aucune répartition" else split,
+                 title=f"Acquisitions en {label} ({country})",
+                 labels={'Nombre de clients': 'Nombre de clients'},
+                 text='Nombre de clients')
+
+    fig.update_layout(barmode='stack')
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Créer le graphique avec deux lignes : base historique et cohorte
+    fig_second_order = plot_second_order_curve(cohort['second_order_curves'])
+    st.plotly_chart(fig_second_order, use_container_width=True)
+
+    # Boîtes d'information pour mono/multi-orders
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label="Clients Mono-order", value=mono_order_clients)
+    with col2:
+        st.metric(label="Clients Multi-order", value=multi_order_clients)
+    with col3:
+        st.metric(label="% Mono-order", value=f"{percent_mono_order:.2f}%")
+
+    # Segmentation par ancienneté
+    st.subheader("Répartition par ancienneté")
+    # Stats par groupe calculées au niveau client, mémoïsées sur (version de la table des clients, jour) et décalées à minuit
+    cohort_key = (start_month, end_month, country, baseline_start, baseline_end, baseline_country)
+    seniority_stats = cohort_seniority_stats(cohort_key, cohort_clients, cohort['version'], day=today)
+
+    # Afficher les boîtes pour chaque groupe d'ancienneté
+    col1, col2, col3, col4, col5 = st.columns(5)
+    for idx, col in enumerate([col1, col2, col3, col4, col5]):
+        groupe = seniority_labels[idx]
+        row = seniority_stats[seniority_stats['Groupe ancienneté'] == groupe]
+        if not row.empty:
+            total = int(row['Restaurant ID'].values[0])  # Total des clients
+            mono = int(row['Jours avec commande'].values[0])  # Mono-orders
+            percent_mono = (mono / total) * 100 if total > 0 else 0  # Pourcentage de mono-orders
+
+            # Format plus clair avec trois lignes dans chaque boîte
+            col.metric(label=groupe, value=f"Total: {total}",
+                       delta=f"Mono: {mono} ({percent_mono:.1f}%)",
+                       delta_color="off")
+
+    # Tableau des clients mono-order
+    st.subheader("Clients Mono-order")
+    mono_clients = cohort_clients[cohort_clients['Jours avec commande'] == 1][['Restaurant ID', 'Restaurant', 'Postal code', 'date 1ere commande (Restaurant)']]
+    mono_clients['Ancienneté'] = (today - mono_clients['date 1ere commande (Restaurant)'].dt.normalize()).dt.days.astype(int)
+
+    # Affichage du tableau des clients mono-order, trié et paginé côté serveur
+    paginated_dataframe(mono_clients, key='mono_clients')
+
+    # Historique détaillé d'un client de la cohorte
+    st.subheader("Historique d'un client")
+    render_client_drill_down(cohort_clients)
+
+
+def main():
+    st.title("Suivi par cohorte")
+
+    if ingestion_mode == 'streaming':
+        df = load_client_aggregates()
+    else:
+        df = load_prepared_data(['Pays', 'date 1ere commande (Restaurant)'])
+    last_first_order = df['date 1ere commande (Restaurant)'].max()
+    months = [str(month) for month in pd.period_range(start='2024-01', end=min(last_first_order, pd.Timestamp.today()), freq='M')]
+    countries = sorted(df['Pays'].dropna().unique())
+
+    # Paramètres de la cohorte et de la base historique
+    col1, col2, col3 = st.columns(3)
+    start_month = col1.selectbox("Premier mois de la cohorte", months, index=len(months) - 1)
+    end_month = col2.selectbox("Dernier mois de la cohorte", months, index=len(months) - 1)
+    country = col3.selectbox("Pays", countries, index=countries.index('FR') if 'FR' in countries else 0)
+
+    col1, col2, col3 = st.columns(3)
+    baseline_start = col1.date_input("Début de la base historique", value=pd.Timestamp('2024-01-01'))
+    baseline_end = col2.date_input("Fin de la base historique", value=pd.Timestamp('2024-06-30'))
+    same_country = col3.checkbox("Base historique limitée au pays", value=False)
+
+    if pd.Period(end_month, freq='M') < pd.Period(start_month, freq='M'):
+        st.warning("Le dernier mois de la cohorte doit être postérieur au premier.")
+        return
+
+    st.header(f"Cohorte {cohort_label(start_month, end_month)} ({country})")
+    render_cohort(start_month, end_month, country, str(baseline_start), str(baseline_end),
+                  baseline_country=country if same_country else None)
+
+
+if __name__ == "__main__":
+    main()
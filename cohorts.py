@@ -0,0 +1,91 @@
+import pandas as pd
+from order_days import build_client_order_table
+
+# Histogramme du temps jusqu'à la deuxième commande : un compteur par jour jusqu'à 60 jours, puis un compteur au-delà
+HISTOGRAM_DAYS = 60
+histogram_columns = [f'J{day}' for day in range(HISTOGRAM_DAYS + 1)] + [f'J>{HISTOGRAM_DAYS}']
+cohort_keys = ['Pays', 'Mois 1ère commande']
+# Colonnes des agrégats par client (mode streaming) utiles aux cohortes
+aggregate_columns = ['Restaurant ID', 'Pays', 'date 1ere commande (Restaurant)', 'Jours avec commande', 'Commande 1', 'Days to 2nd order']
+
+
+# Fonction pour préparer la table par client et par pays (commandes et premières commandes à partir du 1er janvier 2024)
+def build_cohort_clients(df):
+    df = df[df['Date de commande'] >= pd.Timestamp('2024-01-01')]
+    df = df.dropna(subset=['date 1ere commande (Restaurant)'])
+
+    clients = df.groupby(['Restaurant ID', 'Pays'], observed=True)['date 1ere commande (Restaurant)'].first()
+    clients = clients.rename('Date 1ère commande').reset_index()
+    clients = clients[(clients['Date 1ère commande'] >= pd.Timestamp('2024-01-01')) &
+                      (clients['Date 1ère commande'] <= pd.Timestamp.today())]
+
+    # Jours de commande et temps jusqu'à la deuxième commande, toutes commandes du client confondues
+    order_table = build_client_order_table(df)
+    clients = clients.merge(order_table[['Restaurant ID', 'Jours avec commande', 'Commande 1', 'Days to 2nd order']], on='Restaurant ID', how='left')
+    clients['Mois 1ère commande'] = clients['Date 1ère commande'].dt.to_period('M')
+
+    return clients
+
+
+# Fonction pour préparer la table des clients par cohorte à partir des agrégats par client du mode streaming
+def build_cohort_clients_from_aggregates(aggregates):
+    clients = aggregates[aggregate_columns]
+    clients = clients.rename(columns={'date 1ere commande (Restaurant)': 'Date 1ère commande'})
+    clients = clients[(clients['Date 1ère commande'] >= pd.Timestamp('2024-01-01')) &
+                      (clients['Date 1ère commande'] <= pd.Timestamp.today())].reset_index(drop=True)
+    clients['Mois 1ère commande'] = clients['Date 1ère commande'].dt.to_period('M')
+
+    return clients
+
+
+# Fonction pour agréger les clients par cohorte (pays, mois de première commande) en un seul groupby
+def aggregate_cohorts(clients):
+    multi = clients['Jours avec commande'] > 1
+
+    # Colonne d'histogramme de chaque client multi-achats (aucune pour les clients mono-achat)
+    days = clients['Days to 2nd order'].where(multi)
+    buckets = ('J' + days.clip(upper=HISTOGRAM_DAYS).astype('Int64').astype('string')).mask(days > HISTOGRAM_DAYS, f'J>{HISTOGRAM_DAYS}')
+    histogram = pd.get_dummies(pd.Categorical(buckets, categories=histogram_columns), dtype='int64')
+    histogram.index = clients.index
+
+    counts = pd.concat([
+        clients[cohort_keys],
+        (clients['Jours avec commande'] == 1).astype('int64').rename('Clients mono-achat'),
+        multi.astype('int64').rename('Clients multi-achats'),
+        histogram
+    ], axis=1)
+
+    return counts.groupby(cohort_keys, observed=True).sum().reset_index()
+
+
+# Fonction pour construire la table des cohortes à partir des commandes
+def build_cohort_table(df):
+    return aggregate_cohorts(build_cohort_clients(df))
+
+
+# Fonction pour construire la table des cohortes à partir des agrégats par client (mode streaming)
+def build_cohort_table_from_aggregates(aggregates):
+    return aggregate_cohorts(build_cohort_clients_from_aggregates(aggregates))
+
+
+# Fonction pour mettre à jour la table des cohortes après l'arrivée de nouvelles commandes :
+# seules les cohortes des clients concernés sont recalculées
+def update_cohort_table(cohorts, df, new_orders):
+    first_months = df['date 1ere commande (Restaurant)'].dt.to_period('M')
+    new_client_rows = df['Restaurant ID'].isin(new_orders['Restaurant ID'].unique())
+    affected = pd.MultiIndex.from_frame(pd.DataFrame({
+        'Pays': df.loc[new_client_rows, 'Pays'],
+        'Mois 1ère commande': first_months[new_client_rows]
+    }).drop_duplicates())
+
+    # Toutes les commandes des clients appartenant aux cohortes concernées
+    in_affected = pd.MultiIndex.from_arrays([df['Pays'], first_months]).isin(affected)
+    affected_clients = df.loc[in_affected, 'Restaurant ID'].unique()
+    updated = build_cohort_table(df[df['Restaurant ID'].isin(affected_clients)])
+    updated = updated[pd.MultiIndex.from_frame(updated[cohort_keys]).isin(affected)]
+
+    unchanged = cohorts[~pd.MultiIndex.from_frame(cohorts[cohort_keys]).isin(affected)]
+    cohorts = pd.concat([unchanged, updated], ignore_index=True)
+    cohorts['Pays'] = cohorts['Pays'].astype('category')
+
+    return cohorts.sort_values(cohort_keys, ignore_index=True)
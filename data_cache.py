@@ -0,0 +1,104 @@
+import hashlib
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Répertoire du cache colonnaire (Parquet) des fichiers sources
+CACHE_DIR = os.path.join('data', 'cache')
+
+# Empreintes déjà calculées, indexées par (chemin, taille, date de modification)
+_digests = {}
+
+
+# Fonction pour calculer l'empreinte SHA-256 d'un fichier source (lecture par blocs)
+def file_digest(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        _digests[key] = sha.hexdigest()
+    return _digests[key]
+
+
+# Version d'un fichier source (son empreinte), None tant qu'il n'existe pas
+def source_version(path):
+    return file_digest(path) if os.path.exists(path) else None
+
+
+# Chemin du fichier Parquet correspondant à une version donnée du fichier source
+def cache_path(name, digest):
+    return os.path.join(CACHE_DIR, f'{name}-{digest[:16]}.parquet')
+
+
+# Écrire un DataFrame en Parquet de façon atomique (fichier temporaire puis renommage)
+def write_parquet(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+# Lire un fichier Parquet du cache en rétablissant les colonnes catégorielles d'origine (d'après les métadonnées
+# pandas du schéma) : pyarrow ne les restitue d'elles-mêmes que pour les catégories de chaînes
+def read_parquet(path, columns=None, filters=None):
+    df = pd.read_parquet(path, columns=columns, filters=filters)
+    metadata = pq.read_schema(path).pandas_metadata or {}
+    categorical_columns = [column['name'] for column in metadata.get('columns', [])
+                           if column.get('pandas_type') == 'categorical' and column['name'] in df.columns]
+    for column in categorical_columns:
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+# Supprimer les versions périmées du cache pour un fichier source
+def remove_stale(name, keep_path):
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for filename in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, filename)
+        if filename.startswith(f'{name}-') and filename.endswith('.parquet') and path != keep_path:
+            os.remove(path)
+
+
+# Charger un fichier source via son cache Parquet, en le (re)construisant si le fichier source a changé
+def load_cached_frame(source_path, name, build, columns=None, filters=None):
+    path = cache_path(name, file_digest(source_path))
+    if not os.path.exists(path):
+        write_parquet(build(source_path), path)
+        remove_stale(name, path)
+    return read_parquet(path, columns=columns, filters=filters)
+
+
+# Dernière version en cache d'un fichier source (None s'il n'y en a pas)
+def latest_cache(name):
+    if not os.path.isdir(CACHE_DIR):
+        return None
+    paths = [os.path.join(CACHE_DIR, filename) for filename in os.listdir(CACHE_DIR)
+             if filename.startswith(f'{name}-') and filename.endswith('.parquet')]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+# Mettre à jour le cache après un changement du fichier source en n'y ajoutant que les lignes
+# postérieures à la dernière date déjà en cache (les lignes déjà en cache sont conservées telles quelles)
+# Retourne les lignes ajoutées, ou None si le cache a été entièrement (re)construit
+def append_new_rows(source_path, name, read_rows, date_column):
+    path = cache_path(name, file_digest(source_path))
+    if os.path.exists(path):
+        return None
+    previous_path = latest_cache(name)
+    new_rows = None
+    if previous_path is None:
+        write_parquet(read_rows(source_path), path)
+    else:
+        cached = read_parquet(previous_path)
+        new_rows = read_rows(source_path, after=cached[date_column].max())
+        df = pd.concat([cached, new_rows], ignore_index=True)
+        for column in cached.select_dtypes(include='category').columns:
+            df[column] = df[column].astype('category')
+        write_parquet(df, path)
+    remove_stale(name, path)
+    return new_rows
@@ -1,13 +1,37 @@
 import pandas as pd
-import gdown
 import os
+import sys
+import threading
 import streamlit as st
+from data_cache import load_cached_frame, append_new_rows, latest_cache, cache_path, read_parquet, write_parquet, remove_stale, file_digest
+from data_refresh import remote_revision, fetch_all, download_status, load_revisions, save_revisions
+from cohorts import build_cohort_table, build_cohort_table_from_aggregates, update_cohort_table
+from streaming import stream_client_aggregates, read_order_chunks
+from client_index import build_order_days, build_client_index
+from enrichment import build_client_attributes
+from batch import run_batch
+from artifacts import fresh_manifest, read_artifact
+from instrumentation import instrument
 
-# URLs des fichiers Google Drive
-prepared_data_url = 'https://drive.google.com/uc?id=1krOrcWcYr2F_shA4gUYZ1AQFsuWja9dM'
-google_sheets_url = 'https://drive.google.com/uc?id=1sv6E1UsMV3fe-T_3p94uAUt1kz4xlXZA'
+# Copy-on-Write : les vues et projections partagent les données du DataFrame en cache sans jamais le modifier
+# (toujours actif à partir de pandas 3)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
-@st.cache_data
+# URLs des fichiers Google Drive (remplaçables par un fichier local ou un serveur HTTP de test)
+prepared_data_url = os.environ.get('PREPARED_DATA_URL', 'https://drive.google.com/uc?id=1krOrcWcYr2F_shA4gUYZ1AQFsuWja9dM')
+google_sheets_url = os.environ.get('GOOGLE_SHEETS_URL', 'https://drive.google.com/uc?id=1sv6E1UsMV3fe-T_3p94uAUt1kz4xlXZA')
+
+# Mode d'ingestion : 'memory' (toutes les commandes en mémoire) ou 'streaming' (CSV lu par blocs et réduit
+# aux agrégats par client, pour les historiques trop volumineux pour la mémoire)
+ingestion_mode = os.environ.get('INGESTION_MODE', 'memory')
+
+# Colonnes utilisées par les pages et leurs types dans le cache
+date_columns = ['Date de commande', 'date 1ere commande (Restaurant)']
+category_columns = ['Restaurant ID', 'Pays', 'Postal code']
+prepared_columns = ['Restaurant ID', 'Restaurant', 'Postal code', 'Pays'] + date_columns
+
+@instrument(cache=st.cache_data)
 def download_files():
     data_dir = 'data'
     os.makedirs(data_dir, exist_ok=True)
@@ -16,31 +40,223 @@ def download_files():
     output_prepared = os.path.join(data_dir, 'prepared_data.csv')
     output_google_sheets = os.path.join(data_dir, 'google_sheets_data.xlsx')
     
-    # Télécharger les fichiers s'ils n'existent pas encore
-    if not os.path.exists(output_prepared):
-        gdown.download(prepared_data_url, output_prepared, quiet=False)
-    if not os.path.exists(output_google_sheets):
-        gdown.download(google_sheets_url, output_google_sheets, quiet=False)
+    # Télécharger en parallèle les fichiers qui n'existent pas encore (avec reprise et nouvelles tentatives)
+    missing = [(url, output) for url, output in [(prepared_data_url, output_prepared), (google_sheets_url, output_google_sheets)]
+               if not os.path.exists(output)]
+    _, errors = fetch_all(missing)
+    if errors:
+        raise next(iter(errors.values()))
+
+# Lire le CSV des commandes et typer les colonnes (dates en datetime64, identifiants en catégories)
+# Si after est fourni, seules les commandes postérieures à cette date sont conservées
+@instrument()
+def read_prepared_csv(path, after=None):
+    df = pd.read_csv(path, usecols=lambda column: column in prepared_columns, dtype={'Postal code': 'string'}, decimal='.')
+    df['Date de commande'] = pd.to_datetime(df['Date de commande'], errors='coerce')
+    if after is not None:
+        df = df[df['Date de commande'] > after].reset_index(drop=True)
+    df['date 1ere commande (Restaurant)'] = pd.to_datetime(df['date 1ere commande (Restaurant)'], errors='coerce')
+    for column in category_columns:
+        df[column] = df[column].astype('category')
+    return df
+
+# Lire le classeur Google Sheets (les colonnes texte sont stockées en chaînes pour le cache Parquet)
+# calamine est bien plus rapide qu'openpyxl sur les grands classeurs ; openpyxl reste utilisé s'il n'est pas installé
+@instrument()
+def read_google_sheets_xlsx(path):
+    try:
+        df = pd.read_excel(path, engine='calamine')
+    except ImportError:
+        df = pd.read_excel(path, engine='openpyxl')
+    object_columns = df.select_dtypes(include='object').columns
+    return df.astype({column: 'string' for column in object_columns})
 
-@st.cache_data
-def load_prepared_data():
+# DataFrame des commandes partagé entre les sessions : mis en cache comme ressource,
+# il n'est ni haché ni copié à chaque exécution de la page
+@instrument(cache=st.cache_resource)
+def load_prepared_frame():
     data_dir = 'data'
     download_files()
     
-    # Charger et filtrer les données CSV
-    df = pd.read_csv(os.path.join(data_dir, 'prepared_data.csv'), parse_dates=['Date de commande'], decimal='.')
-    
-    # Filtrer à partir du 1er janvier 2024
-    df_filtered = df[df['Date de commande'] >= '2024-01-01']
+    # Charger les données depuis le cache Parquet, filtrées à partir du 1er janvier 2024 dès la lecture
+    df_filtered = load_cached_frame(
+        os.path.join(data_dir, 'prepared_data.csv'), 'prepared_data', read_prepared_csv,
+        columns=prepared_columns, filters=[('Date de commande', '>=', pd.Timestamp('2024-01-01'))]
+    )
     
     return df_filtered
 
-@st.cache_data
+# Accès en lecture aux commandes : copie superficielle (sans copie des données) du DataFrame partagé,
+# une modification par l'appelant ne se répercute donc jamais sur le cache
+def load_prepared_data(columns=None):
+    df = load_prepared_frame()
+    if columns is not None:
+        return df[columns]
+    return df.copy(deep=False)
+
+@instrument(cache=st.cache_data)
 def load_google_sheets_data():
     data_dir = 'data'
     download_files()
     
-    # Charger les données du fichier Google Sheets
-    df_google_sheets = pd.read_excel(os.path.join(data_dir, 'google_sheets_data.xlsx'), engine='openpyxl')
+    # Charger les données du fichier Google Sheets depuis le cache Parquet
+    df_google_sheets = load_cached_frame(os.path.join(data_dir, 'google_sheets_data.xlsx'), 'google_sheets_data', read_google_sheets_xlsx)
     
     return df_google_sheets
+
+@instrument(cache=st.cache_data)
+def load_cohort_table():
+    data_dir = 'data'
+    
+    # Table des cohortes matérialisée à côté du cache des données, construite une seule fois par version du fichier source
+    if ingestion_mode == 'streaming':
+        build = lambda path: build_cohort_table_from_aggregates(load_client_aggregates())
+    else:
+        build = lambda path: build_cohort_table(load_prepared_data())
+    return load_cached_frame(os.path.join(data_dir, 'prepared_data.csv'), 'cohorts', build)
+
+# Agrégats par client (jours de commande distincts, deux premières et dernière commandes, attributs du client) calculés
+# en lisant le CSV par blocs : les commandes brutes ne sont jamais chargées en entier
+# (cache 'client_aggregates_v2' : les caches antérieurs n'ont pas la dernière commande)
+@instrument(cache=st.cache_data)
+def load_client_aggregates():
+    data_dir = 'data'
+    download_files()
+    
+    return load_cached_frame(os.path.join(data_dir, 'prepared_data.csv'), 'client_aggregates_v2',
+                             lambda path: stream_client_aggregates(path, start_date='2024-01-01'))
+
+# Courbes mono/multi-achats et temps jusqu'à la 2e commande de tous les pays et de toutes les cohortes,
+# calculées en parallèle (une partition par pays) ; en mode streaming, à partir des agrégats par client
+@instrument(cache=st.cache_data)
+def load_batch_curves():
+    if ingestion_mode == 'streaming':
+        return run_batch(load_client_aggregates(), from_aggregates=True)
+    return run_batch(load_prepared_data())
+
+# Attributs clients du classeur indexés par Restaurant ID, lus depuis le cache Parquet du classeur (sans relire l'Excel)
+@instrument(cache=st.cache_data)
+def load_client_attributes():
+    return build_client_attributes(load_google_sheets_data())
+
+# Index des commandes par client (jours de commande triés par client et décalages), construit une fois par version
+# du fichier source et partagé entre les sessions : l'historique d'un client se lit sans reparcourir les commandes
+@instrument(cache=st.cache_resource)
+def load_client_index():
+    data_dir = 'data'
+    download_files()
+    
+    if ingestion_mode == 'streaming':
+        build = lambda path: build_order_days(read_order_chunks(path, start_date='2024-01-01'))
+    else:
+        build = lambda path: build_order_days([load_prepared_data(['Restaurant ID', 'Date de commande'])])
+    order_days = load_cached_frame(os.path.join(data_dir, 'prepared_data.csv'), 'client_order_days', build)
+    return build_client_index(order_days)
+
+# Mettre à jour la table des cohortes persistée pour les seules cohortes touchées par les nouvelles commandes
+def update_cohort_cache(source_path, new_orders):
+    previous_path = latest_cache('cohorts')
+    if new_orders is None or previous_path is None or ingestion_mode == 'streaming':
+        return
+    
+    df = load_cached_frame(source_path, 'prepared_data', read_prepared_csv,
+                           columns=prepared_columns, filters=[('Date de commande', '>=', pd.Timestamp('2024-01-01'))])
+    cohorts = update_cohort_table(read_parquet(previous_path), df, new_orders)
+    
+    path = cache_path('cohorts', file_digest(source_path))
+    write_parquet(cohorts, path)
+    remove_stale('cohorts', path)
+
+# Chargements mis en cache qui dépendent de chaque fichier source ; ceux des pages, qui importent ce module, sont
+# désignés par 'module.fonction' et ne sont vidés que si la page a déjà été chargée
+dependent_caches = {
+    'prepared_data.csv': [load_prepared_frame, load_cohort_table, load_client_aggregates, load_batch_curves, load_client_index,
+                          fresh_manifest, read_artifact, 'cohorte.compute_cohort'],
+    'google_sheets_data.xlsx': [load_google_sheets_data, load_client_attributes],
+}
+
+# Vider les caches qui dépendent d'un fichier source
+def clear_dependent_caches(filename):
+    for loader in dependent_caches[filename]:
+        if isinstance(loader, str):
+            module_name, name = loader.rsplit('.', 1)
+            if module_name not in sys.modules:
+                continue
+            loader = getattr(sys.modules[module_name], name)
+        loader.clear()
+
+# Rafraîchir les fichiers dont la révision distante a changé (téléchargés en parallèle) et n'invalider que les caches
+# qui en dépendent ; les fichiers en place ne sont remplacés qu'une fois le nouveau contenu complet et vérifié
+@instrument()
+def refresh_data():
+    data_dir = 'data'
+    revisions = load_revisions()
+    sources = [('prepared_data.csv', prepared_data_url), ('google_sheets_data.xlsx', google_sheets_url)]
+    
+    # Révision inchangée : rien à télécharger (si elle est inconnue, le contenu téléchargé est comparé)
+    remote_revisions = {filename: remote_revision(url) for filename, url in sources}
+    transfers = [(url, os.path.join(data_dir, filename)) for filename, url in sources
+                 if not os.path.exists(os.path.join(data_dir, filename)) or remote_revisions[filename] is None
+                 or remote_revisions[filename] != revisions.get(filename)]
+    results, errors = fetch_all(transfers)
+    
+    changed_files = []
+    for filename, _ in sources:
+        output = os.path.join(data_dir, filename)
+        if output not in results:
+            continue
+        if results[output]:
+            changed_files.append(filename)
+            if filename == 'prepared_data.csv':
+                # En mode streaming, les agrégats et les cohortes sont reconstruits par blocs à la prochaine lecture
+                if ingestion_mode != 'streaming':
+                    new_orders = append_new_rows(output, 'prepared_data', read_prepared_csv, 'Date de commande')
+                    update_cohort_cache(output, new_orders)
+            clear_dependent_caches(filename)
+        revisions[filename] = remote_revisions[filename]
+    
+    save_revisions(revisions)
+    if errors:
+        raise next(iter(errors.values()))
+    return changed_files
+
+# Rafraîchissement en arrière-plan, un seul à la fois par processus : les pages continuent d'afficher
+# la dernière version valide des données pendant le téléchargement
+_refresh_state = {'thread': None, 'generation': 0, 'changed_files': None, 'error': None}
+_refresh_lock = threading.Lock()
+
+def start_refresh():
+    def run():
+        try:
+            changed_files, error = refresh_data(), None
+        except Exception as exception:
+            changed_files, error = None, exception
+        with _refresh_lock:
+            _refresh_state.update(changed_files=changed_files, error=error)
+    
+    with _refresh_lock:
+        if _refresh_state['thread'] is not None and _refresh_state['thread'].is_alive():
+            return False
+        thread = threading.Thread(target=run, name='rafraichissement-donnees', daemon=True)
+        _refresh_state.update(thread=thread, generation=_refresh_state['generation'] + 1, changed_files=None, error=None)
+        thread.start()
+    return True
+
+# État du dernier rafraîchissement en arrière-plan et avancement des téléchargements
+def refresh_status():
+    with _refresh_lock:
+        thread = _refresh_state['thread']
+        status = {key: value for key, value in _refresh_state.items() if key != 'thread'}
+    status['running'] = thread is not None and thread.is_alive()
+    status['transfers'] = download_status()
+    return status
+
+# Précharger les données (téléchargement, lecture du cache, table des cohortes) pour que la première page
+# de données s'affiche sans attente ; appelé en arrière-plan pendant l'affichage de la page d'accueil
+def prefetch_data():
+    download_files()
+    if ingestion_mode == 'streaming':
+        load_client_aggregates()
+    else:
+        load_prepared_frame()
+    load_cohort_table()
@@ -0,0 +1,276 @@
+import base64
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import gdown
+import requests
+from data_cache import file_digest
+
+# Fichier local des révisions distantes déjà téléchargées
+REVISIONS_PATH = os.path.join('data', 'revisions.json')
+
+# Téléchargements : nombre de tentatives, délai avant la première nouvelle tentative (doublé ensuite), taille des blocs
+MAX_ATTEMPTS = int(os.environ.get('DOWNLOAD_ATTEMPTS', 3))
+RETRY_DELAY = float(os.environ.get('DOWNLOAD_RETRY_DELAY', 1.0))
+CHUNK_SIZE = 1 << 20
+
+# Les versions récentes de gdown signalent l'avancement du téléchargement
+GDOWN_PROGRESS = 'progress' in inspect.signature(gdown.download).parameters
+
+# Avancement des téléchargements, par fichier de destination (lu par l'interface pendant un rafraîchissement)
+transfer_progress = {}
+_progress_lock = threading.Lock()
+
+
+# Chemin local d'une source de type fichier (file://... ou chemin simple), utilisée comme substitut de Google Drive
+def local_source_path(url):
+    parsed = urlparse(url)
+    if parsed.scheme == 'file':
+        return url2pathname(parsed.path)
+    if parsed.scheme == '':
+        return url
+    return None
+
+
+# Fonction pour obtenir la révision distante d'un fichier sans le télécharger (None si inconnue)
+def remote_revision(url):
+    path = local_source_path(url)
+    if path is not None:
+        stat = os.stat(path)
+        return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+    response = requests.head(url, allow_redirects=True, timeout=30)
+    response.raise_for_status()
+    if response.headers.get('ETag'):
+        return response.headers['ETag']
+    if response.headers.get('Last-Modified'):
+        return f"{response.headers['Last-Modified']}-{response.headers.get('Content-Length')}"
+    return None
+
+
+# Mettre à jour l'avancement du téléchargement d'un fichier
+def report_progress(output, **values):
+    with _progress_lock:
+        transfer_progress[output] = {**transfer_progress.get(output, {}), **values}
+
+
+# Copie de l'avancement des téléchargements ({fichier: {'status', 'done', 'total', 'attempt'}})
+def download_status():
+    with _progress_lock:
+        return {output: dict(values) for output, values in transfer_progress.items()}
+
+
+# Sommes de contrôle annoncées par le serveur pour le contenu complet (Content-MD5, X-Goog-Hash, Digest)
+def announced_checksums(headers):
+    checksums = {}
+    if headers.get('Content-MD5'):
+        checksums['md5'] = headers['Content-MD5']
+    for header in ['X-Goog-Hash', 'Digest']:
+        for algorithm, value in re.findall(r'([\w-]+)=([A-Za-z0-9+/=]+)', headers.get(header, '')):
+            algorithm = algorithm.lower().replace('-', '')
+            if algorithm in ('md5', 'sha256'):
+                checksums[algorithm] = value
+    return checksums
+
+
+# Vérifier un fichier téléchargé par rapport aux sommes de contrôle annoncées (encodées en base64)
+def verify_checksums(path, checksums):
+    if not checksums:
+        return
+    hashes = {algorithm: hashlib.new(algorithm) for algorithm in checksums}
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            for digest in hashes.values():
+                digest.update(block)
+    for algorithm, expected in checksums.items():
+        if base64.b64encode(hashes[algorithm].digest()).decode() != expected:
+            raise ValueError(f"Somme de contrôle {algorithm} invalide pour {path}")
+
+
+# État d'un fichier partiel, enregistré à côté de lui ({fichier partiel}.json) : révision distante téléchargée,
+# validateur HTTP (ETag ou Last-Modified) et taille et sommes de contrôle du contenu complet annoncées au début du transfert
+def part_state_path(part_path):
+    return f'{part_path}.json'
+
+
+def load_part_state(part_path):
+    path = part_state_path(part_path)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def save_part_state(part_path, state):
+    path = part_state_path(part_path)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+# Supprimer un fichier partiel, son état et les fichiers partiels laissés par gdown ({fichier partiel}*.part)
+def discard_partial(part_path):
+    directory, name = os.path.split(part_path)
+    for filename in os.listdir(directory or '.'):
+        if filename.startswith(name):
+            os.remove(os.path.join(directory, filename))
+
+
+# Validateur d'une réponse HTTP pour l'en-tête If-Range : ETag fort, sinon Last-Modified (None si aucun)
+def response_validator(headers):
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+# Source locale (substitut de Google Drive) : simple copie
+def fetch_local(url, part_path, progress, state):
+    shutil.copyfile(local_source_path(url), part_path)
+    size = os.path.getsize(part_path)
+    progress(size, size)
+    return {}
+
+
+# Source HTTP : téléchargement par blocs, repris là où il s'était arrêté (en-têtes Range et If-Range) si un fichier
+# partiel existe. Le serveur ne renvoie la suite que si le contenu n'a pas changé depuis le début du transfert,
+# sinon il renvoie le nouveau contenu complet (200) et le téléchargement repart de zéro
+def fetch_http(url, part_path, progress, state):
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {}
+    if offset and state.get('validator'):
+        headers = {'Range': f'bytes={offset}-', 'If-Range': state['validator']}
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 416:
+            # Le fichier partiel est déjà complet (ou plus grand que la source) : repartir de zéro
+            os.remove(part_path)
+            return fetch_http(url, part_path, progress, state)
+        response.raise_for_status()
+
+        resumed = bool(headers) and response.status_code == 206
+        content_range = re.match(r'bytes \d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+        if resumed:
+            total = int(content_range.group(1)) if content_range else state.get('size')
+            if state.get('size') is not None and total != state['size']:
+                raise ValueError(f"La taille de {url} a changé pendant le téléchargement")
+        else:
+            # Début du transfert : les sommes annoncées pour le contenu complet servent à vérifier le fichier
+            # une fois terminé, y compris après une reprise (celles d'une réponse partielle ne portent que sur la fin)
+            total = int(response.headers['Content-Length']) if response.headers.get('Content-Length') else None
+            state.update(validator=response_validator(response.headers), size=total,
+                         checksums=announced_checksums(response.headers))
+            save_part_state(part_path, state)
+
+        done = offset if resumed else 0
+        with open(part_path, 'ab' if resumed else 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                done += len(chunk)
+                progress(done, total)
+
+    if total is not None and done != total:
+        raise IOError(f"Téléchargement incomplet de {url} : {done} octets sur {total}")
+    return state.get('checksums', {})
+
+
+# Source Google Drive : gdown gère la page de confirmation des gros fichiers et la reprise des fichiers partiels
+def fetch_gdrive(url, part_path, progress, state):
+    kwargs = {'progress': progress} if GDOWN_PROGRESS else {}
+    gdown.download(url, part_path, quiet=True, resume=True, **kwargs)
+    return {}
+
+
+# Fonction de téléchargement par hôte (prioritaire) ou par schéma d'URL ; une source de test peut y être ajoutée
+fetchers = {
+    'drive.google.com': fetch_gdrive,
+    'http': fetch_http,
+    'https': fetch_http,
+}
+
+
+def source_fetcher(url):
+    if local_source_path(url) is not None:
+        return fetch_local
+    parsed = urlparse(url)
+    return fetchers.get(parsed.hostname) or fetchers[parsed.scheme]
+
+
+# Télécharger un fichier dans un fichier partiel (conservé entre les tentatives pour la reprise), vérifier son contenu,
+# puis le substituer atomiquement à l'ancien ; jusqu'à MAX_ATTEMPTS tentatives. Retourne True si le contenu a changé
+# Un fichier partiel n'est repris que s'il provient de la révision distante actuelle
+def fetch_atomic(url, output):
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    part_path = f'{output}.part'
+    fetch = source_fetcher(url)
+    progress = lambda done, total: report_progress(output, done=done, total=total)
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        report_progress(output, status='en cours', attempt=attempt, done=0, total=None)
+        try:
+            revision = remote_revision(url)
+            state = load_part_state(part_path)
+            if revision is None or state.get('revision') != revision:
+                discard_partial(part_path)
+                state = {'revision': revision}
+                save_part_state(part_path, state)
+            verify_checksums(part_path, fetch(url, part_path, progress, state))
+            break
+        except Exception as error:
+            # Un fichier dont la somme de contrôle est invalide ne peut pas être repris
+            if isinstance(error, ValueError):
+                discard_partial(part_path)
+            if attempt == MAX_ATTEMPTS:
+                report_progress(output, status='échec')
+                raise
+            time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+    report_progress(output, status='terminé')
+    changed = not (os.path.exists(output) and file_digest(output) == file_digest(part_path))
+    if changed:
+        os.replace(part_path, output)
+    discard_partial(part_path)
+    return changed
+
+
+# Télécharger plusieurs fichiers en parallèle ([(url, destination)]) : retourne, par destination, si le contenu a changé,
+# et les erreurs des téléchargements qui ont échoué (les autres sont menés à terme)
+def fetch_all(transfers):
+    results, errors = {}, {}
+    if not transfers:
+        return results, errors
+    with ThreadPoolExecutor(max_workers=len(transfers), thread_name_prefix='telechargement') as pool:
+        futures = {output: pool.submit(fetch_atomic, url, output) for url, output in transfers}
+    for output, future in futures.items():
+        try:
+            results[output] = future.result()
+        except Exception as error:
+            errors[output] = error
+    return results, errors
+
+
+def load_revisions():
+    if not os.path.exists(REVISIONS_PATH):
+        return {}
+    with open(REVISIONS_PATH) as f:
+        return json.load(f)
+
+
+def save_revisions(revisions):
+    os.makedirs(os.path.dirname(REVISIONS_PATH), exist_ok=True)
+    tmp_path = f'{REVISIONS_PATH}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(revisions, f, indent=2)
+    os.replace(tmp_path, REVISIONS_PATH)
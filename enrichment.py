@@ -0,0 +1,35 @@
+import pandas as pd
+
+# Nombre maximal de valeurs distinctes d'un attribut du classeur pour qu'il serve à répartir les graphiques
+MAX_SPLIT_VALUES = 20
+
+
+# Identifiants clients en chaînes, qu'ils soient lus comme nombres (Excel) ou comme texte (CSV des commandes)
+def normalize_client_ids(ids):
+    if pd.api.types.is_numeric_dtype(ids):
+        ids = ids.astype('Int64')
+    return ids.astype('string').str.strip()
+
+
+# Attributs clients du classeur (commercial, segment, ...) indexés par Restaurant ID : une ligne par client
+# (la première en cas de doublon), retrouvée par la table de hachage de l'index
+def build_client_attributes(sheet):
+    if 'Restaurant ID' not in sheet.columns:
+        return pd.DataFrame(index=pd.Index([], dtype='string', name='Restaurant ID'))
+
+    attributes = sheet.drop(columns='Restaurant ID')
+    attributes.index = pd.Index(normalize_client_ids(sheet['Restaurant ID']), name='Restaurant ID')
+    return attributes[attributes.index.notna() & ~attributes.index.duplicated()]
+
+
+# Attributs pouvant répartir les graphiques des cohortes : colonnes texte avec peu de valeurs distinctes
+def split_columns(attributes):
+    text_columns = attributes.select_dtypes(include=['string', 'object', 'category']).columns
+    return [column for column in text_columns if 0 < attributes[column].nunique() <= MAX_SPLIT_VALUES]
+
+
+# Joindre les attributs du classeur à une table par client (valeur manquante si le client n'est pas dans le classeur)
+def enrich_clients(clients, attributes):
+    joined = attributes.drop(columns=clients.columns, errors='ignore').reindex(normalize_client_ids(clients['Restaurant ID']))
+    joined.index = clients.index
+    return pd.concat([clients, joined], axis=1)
@@ -0,0 +1,162 @@
+import datetime
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+
+# Journal structuré (une ligne JSON par étape, fichiers tournants) et fichier de métriques au format Prometheus.
+# Une variable d'environnement vide désactive la sortie correspondante.
+LOG_PATH = os.environ.get('INSTRUMENTATION_LOG', os.path.join('logs', 'instrumentation.jsonl'))
+METRICS_PATH = os.environ.get('INSTRUMENTATION_METRICS', os.path.join('logs', 'metrics.prom'))
+
+_state = threading.local()
+_lock = threading.Lock()
+_totals = {}
+_logger = logging.getLogger('onboarding.instrumentation')
+
+
+# Mémoire résidente actuelle du processus en octets (None hors Linux)
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+# Nombre de lignes d'une entrée ou d'un résultat : DataFrame, dictionnaire de DataFrames ou figure Plotly (points tracés)
+# (sans importer pandas, pour que l'instrumentation reste légère au démarrage de l'application)
+def row_count(value):
+    if hasattr(value, 'shape') and hasattr(value, '__len__'):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(item) for item in value.values() if hasattr(item, 'shape') and hasattr(item, '__len__'))
+    if hasattr(value, 'data') and isinstance(getattr(value, 'data', None), tuple):
+        return sum(len(trace.x) for trace in value.data if getattr(trace, 'x', None) is not None)
+    return None
+
+
+def _call_stack():
+    if not hasattr(_state, 'calls'):
+        _state.calls = []
+    return _state.calls
+
+
+def _run_records():
+    if not hasattr(_state, 'records'):
+        _state.records = []
+    return _state.records
+
+
+# Configurer le journal tournant au premier enregistrement
+def _setup_logger():
+    if _logger.handlers or not LOG_PATH:
+        return
+    os.makedirs(os.path.dirname(LOG_PATH) or '.', exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(LOG_PATH, maxBytes=5 * 2**20, backupCount=5, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+def _record(record):
+    _run_records().append(record)
+    with _lock:
+        totals = _totals.setdefault(record['stage'], {'count': 0, 'seconds': 0.0, 'hits': 0, 'misses': 0, 'rows_out': 0})
+        totals['count'] += 1
+        totals['seconds'] += record['seconds']
+        if record['cache_hit'] is True:
+            totals['hits'] += 1
+        elif record['cache_hit'] is False:
+            totals['misses'] += 1
+        totals['rows_out'] = record['rows_out'] or 0
+    _setup_logger()
+    if _logger.handlers:
+        _logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+# Décorateur d'instrumentation : durée, lignes en entrée/sortie, delta mémoire et, si la fonction est mise en cache
+# (cache=st.cache_data ou st.cache_resource), succès ou échec du cache
+def instrument(stage=None, cache=None):
+    def decorator(func):
+        stage_name = stage or func.__name__
+
+        # Corps réellement exécuté : s'il est appelé, c'est un échec du cache
+        @functools.wraps(func)
+        def body(*args, **kwargs):
+            _call_stack()[-1]['executed'] = True
+            return func(*args, **kwargs)
+
+        cached = cache(body) if cache is not None else body
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            call = {'executed': False}
+            _call_stack().append(call)
+            rss_before = current_rss()
+            start = time.perf_counter()
+            try:
+                result = cached(*args, **kwargs)
+            finally:
+                _call_stack().pop()
+            seconds = time.perf_counter() - start
+            rss_after = current_rss()
+
+            rows_in = next((row_count(arg) for arg in args if row_count(arg) is not None), None)
+            _record({
+                'timestamp': datetime.datetime.now().isoformat(timespec='milliseconds'),
+                'stage': stage_name,
+                'seconds': round(seconds, 4),
+                'rows_in': rows_in,
+                'rows_out': row_count(result),
+                'cache_hit': (not call['executed']) if cache is not None else None,
+                'memory_delta_mb': round((rss_after - rss_before) / 2**20, 2) if rss_before is not None else None,
+            })
+            return result
+
+        if hasattr(cached, 'clear'):
+            wrapper.clear = cached.clear
+        return wrapper
+    return decorator
+
+
+# Début d'une exécution de la page : les mesures affichées dans le panneau de debug repartent de zéro
+def start_run():
+    _state.records = []
+
+
+# Mesures de l'exécution en cours (thread de la session Streamlit)
+def run_records():
+    import pandas as pd
+    return pd.DataFrame(_run_records(), columns=['stage', 'seconds', 'rows_in', 'rows_out', 'cache_hit', 'memory_delta_mb'])
+
+
+# Écrire les totaux par étape au format texte Prometheus (remplacement atomique du fichier)
+def write_metrics(path=METRICS_PATH):
+    if not path:
+        return
+    with _lock:
+        totals = {stage: dict(values) for stage, values in _totals.items()}
+
+    lines = []
+    for name, key, kind, help_text in [
+        ('onboarding_stage_duration_seconds_sum', 'seconds', 'counter', "Durée cumulée de l'étape"),
+        ('onboarding_stage_calls_total', 'count', 'counter', "Nombre d'appels de l'étape"),
+        ('onboarding_stage_cache_hits_total', 'hits', 'counter', "Succès du cache Streamlit"),
+        ('onboarding_stage_cache_misses_total', 'misses', 'counter', "Échecs du cache Streamlit"),
+        ('onboarding_stage_rows_out', 'rows_out', 'gauge', "Lignes produites au dernier appel"),
+    ]:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for stage, values in sorted(totals.items()):
+            lines.append(f'{name}{{stage="{stage}"}} {round(values[key], 6)}')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
@@ -0,0 +1,36 @@
+import pandas as pd
+
+
+# Fonction pour extraire les jours de commande distincts de chaque client, triés par client puis par date
+def distinct_order_days(df):
+    days = pd.DataFrame({
+        'Restaurant ID': df['Restaurant ID'],
+        'Jour de commande': pd.to_datetime(df['Date de commande'], errors='coerce').dt.normalize()
+    })
+
+    # Supprimer les lignes sans client ou sans date, puis les doublons (plusieurs commandes le même jour)
+    days = days.dropna().drop_duplicates()
+    days = days.sort_values(['Restaurant ID', 'Jour de commande'], kind='stable', ignore_index=True)
+
+    # Rang de chaque jour de commande pour le client (0 = première commande)
+    days['Rang'] = days.groupby('Restaurant ID', sort=False, observed=True).cumcount()
+
+    return days
+
+
+# Fonction pour construire la table par client : nombre de jours de commande, dates des N premières commandes
+def build_client_order_table(df, n_orders=2):
+    days = distinct_order_days(df)
+
+    table = days.groupby('Restaurant ID', observed=True).size().rename('Jours avec commande').to_frame()
+
+    # Une colonne par rang de commande (1ère, 2ème, ..., Nème), NaT si le client n'a pas autant de commandes
+    for rank in range(n_orders):
+        nth = days[days['Rang'] == rank].set_index('Restaurant ID')['Jour de commande']
+        table[f'Commande {rank + 1}'] = nth.reindex(table.index)
+
+    # Nombre de jours entre la première et la deuxième commande (NaN pour les clients mono-achat)
+    if n_orders >= 2:
+        table['Days to 2nd order'] = (table['Commande 2'] - table['Commande 1']).dt.days
+
+    return table.reset_index()
@@ -1,66 +1,82 @@
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from order_days import build_client_order_table
+from survival import survival_table
+from instrumentation import instrument
 
-# Fonction pour filtrer les clients français et préparer les données pour mono vs multi-commande
-def load_and_filter_data(df):
-    # Assurer que les colonnes de dates sont bien en datetime
-    df['Date de commande'] = pd.to_datetime(df['Date de commande'], errors='coerce')
-    df['date 1ere commande (Restaurant)'] = pd.to_datetime(df['date 1ere commande (Restaurant)'], errors='coerce')
-    
-    # Filtrer les commandes à partir du 1er janvier 2024
-    df = df[df['Date de commande'] >= pd.Timestamp('2024-01-01')]
-    
-    # Supprimer les enregistrements sans date de première commande
-    df = df.dropna(subset=['date 1ere commande (Restaurant)'])
-    
-    # Ne garder que les clients français
-    clients_fr = df[df['Pays'] == 'FR']
-    
-    # Obtenir la date de première commande et le pays pour chaque client
-    clients = clients_fr.groupby('Restaurant ID').agg({
-        'date 1ere commande (Restaurant)': 'first',
-        'Pays': 'first'
-    }).reset_index()
-    clients.rename(columns={'date 1ere commande (Restaurant)': 'Date 1ère commande'}, inplace=True)
-    
-    # Ne garder que les clients ayant une première commande en 2024
-    clients = clients[(clients['Date 1ère commande'] >= pd.Timestamp('2024-01-01')) &
-                      (clients['Date 1ère commande'] <= pd.Timestamp.today())]
-    
-    # Calculer le nombre de jours distincts avec des commandes pour chaque client
-    order_days = df.groupby('Restaurant ID')['Date de commande'].apply(lambda x: x.dt.normalize().nunique()).reset_index()
-    order_days.rename(columns={'Date de commande': 'Jours avec commande'}, inplace=True)
-    
-    # Fusionner avec le DataFrame des clients
-    clients = clients.merge(order_days, on='Restaurant ID', how='left')
-    
-    # Ajouter le mois de la première commande
-    clients['Mois 1ère commande'] = clients['Date 1ère commande'].dt.to_period('M')
-    
-    return clients
+# Au-delà de WEBGL_POINTS points une courbe est tracée en WebGL (Scattergl), au-delà de MAX_POINTS elle est sous-échantillonnée
+WEBGL_POINTS = 1000
+MAX_POINTS = 5000
+
+# Figures déjà construites, indexées par fonction et empreinte des données (partagées entre les sessions, à ne pas modifier)
+FIGURE_CACHE_SIZE = 64
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+# Empreinte du contenu d'un DataFrame ou d'une Series (valeurs et noms de colonnes)
+def fingerprint(data):
+    sha = hashlib.sha1(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    sha.update(repr(list(data.columns) if isinstance(data, pd.DataFrame) else data.name).encode())
+    return sha.hexdigest()
 
+# Décorateur : la figure n'est reconstruite que si les données (leur empreinte) ou les paramètres changent
+def memoize_figure(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # La date du jour fait partie de la clé : les figures qui en dépendent (mois affichés) sont reconstruites chaque jour
+        key = (func.__name__, pd.Timestamp.today().date()) + tuple(
+            fingerprint(value) if isinstance(value, (pd.DataFrame, pd.Series)) else repr(value)
+            for value in list(args) + [kwargs[name] for name in sorted(kwargs)]
+        ) + tuple(sorted(kwargs))
+        with _figure_cache_lock:
+            if key in _figure_cache:
+                _figure_cache.move_to_end(key)
+                return _figure_cache[key]
+        fig = func(*args, **kwargs)
+        with _figure_cache_lock:
+            _figure_cache[key] = fig
+            if len(_figure_cache) > FIGURE_CACHE_SIZE:
+                _figure_cache.popitem(last=False)
+        return fig
+    return wrapper
 
+# Courbe Plotly adaptée au nombre de points : SVG pour les séries courtes, WebGL et sous-échantillonnage pour les longues
+def line_trace(x, y, **kwargs):
+    x, y = np.asarray(x), np.asarray(y)
+    if len(x) > MAX_POINTS:
+        keep = np.unique(np.append(np.linspace(0, len(x) - 1, MAX_POINTS).astype(int), len(x) - 1))
+        x, y = x[keep], y[keep]
+    if len(x) > WEBGL_POINTS:
+        kwargs['mode'] = 'lines'
+        kwargs.pop('marker', None)
+        return go.Scattergl(x=x, y=y, **kwargs)
+    return go.Scatter(x=x, y=y, **kwargs)
 
+# Assurer que les colonnes de dates sont bien en datetime, sans modifier le DataFrame reçu
+def with_datetime_columns(df):
+    columns = [column for column in ['Date de commande', 'date 1ere commande (Restaurant)']
+               if not pd.api.types.is_datetime64_any_dtype(df[column])]
+    if not columns:
+        return df
+    return df.assign(**{column: pd.to_datetime(df[column], errors='coerce') for column in columns})
 
-# Fonction pour créer un graphique interactif Plotly pour mono vs multi-order
-def plot_mono_vs_multi_order(clients):
+# Fonction pour créer un graphique interactif Plotly pour mono vs multi-order à partir de la table des cohortes
+@instrument()
+@memoize_figure
+def plot_mono_vs_multi_order(cohorts, country='FR'):
     months = pd.period_range(start='2024-01', end=pd.Timestamp.today(), freq='M')
     
-    data_list = []
-    for month in months:
-        month_clients = clients[clients['Mois 1ère commande'] == month]
-        mono_order_clients = len(month_clients[month_clients['Jours avec commande'] == 1])
-        multi_order_clients = len(month_clients[month_clients['Jours avec commande'] > 1])
-        total_clients = mono_order_clients + multi_order_clients
-        percent_mono_order = (mono_order_clients / total_clients) * 100 if total_clients > 0 else 0
-        data_list.append({
-            'Mois': month.to_timestamp(),
-            'Clients mono-achat': mono_order_clients,
-            'Clients multi-achats': multi_order_clients,
-            'Pourcentage mono-achat': percent_mono_order
-        })
-
-    plot_data = pd.DataFrame(data_list)
+    # Lire directement les compteurs mono/multi des cohortes du pays, un mois par ligne
+    country_cohorts = cohorts[cohorts['Pays'] == country].set_index('Mois 1ère commande')
+    plot_data = country_cohorts[['Clients mono-achat', 'Clients multi-achats']].reindex(months, fill_value=0)
+    total_clients = plot_data['Clients mono-achat'] + plot_data['Clients multi-achats']
+    plot_data['Pourcentage mono-achat'] = (plot_data['Clients mono-achat'] / total_clients * 100).where(total_clients > 0, 0)
+    plot_data['Mois'] = months.to_timestamp()
 
     fig = go.Figure(data=[
         go.Bar(name='Clients mono-achat', x=plot_data['Mois'], y=plot_data['Clients mono-achat'], marker_color='#FFA07A', text=plot_data['Pourcentage mono-achat'], texttemplate='%{text:.2f}%', textposition='outside'),
@@ -69,7 +85,7 @@ def plot_mono_vs_multi_order(clients):
     
     fig.update_layout(
         barmode='stack',
-        title="Évolution des nouveaux clients en France (Mono-achat vs Multi-achats)",
+        title=f"Évolution des nouveaux clients ({country}) - Mono-achat vs Multi-achats",
         xaxis_title="Mois",
         yaxis_title="Nombre de nouveaux clients",
         xaxis_tickformat='%Y-%m',
@@ -79,78 +95,44 @@ def plot_mono_vs_multi_order(clients):
     
     return fig
 
-# Fonction pour charger et filtrer les clients multi-commandes
-def load_multi_order_clients(df):
-    # Assurer que les colonnes de dates sont bien en datetime
-    df['Date de commande'] = pd.to_datetime(df['Date de commande'], errors='coerce')
-    df['date 1ere commande (Restaurant)'] = pd.to_datetime(df['date 1ere commande (Restaurant)'], errors='coerce')
-    
-    # Ne garder que les clients ayant passé leur première commande entre le 1er janvier et le 1er juin 2024
-    df = df[(df['date 1ere commande (Restaurant)'] >= pd.Timestamp('2024-01-01')) & 
-            (df['date 1ere commande (Restaurant)'] <= pd.Timestamp('2024-06-01'))]
-    
-    # Supprimer les enregistrements sans date de première commande
-    df = df.dropna(subset=['date 1ere commande (Restaurant)'])
-    
-    # Obtenir les clients avec plus d'une commande (multi-commande)
-    clients = df.groupby('Restaurant ID').agg({
-        'date 1ere commande (Restaurant)': 'first',
-        'Date de commande': lambda x: x.dt.normalize().nunique()  # Nombre de jours distincts avec commandes
-    }).reset_index()
-    
-    multi_order_clients = clients[clients['Date de commande'] > 1]
-    
-    # Joindre les clients multi-commande avec leurs dates de commande
-    df_multi_order = df[df['Restaurant ID'].isin(multi_order_clients['Restaurant ID'])]
-    
-    # Calculer le nombre de jours entre la première et la deuxième commande
-    second_order_days = df_multi_order.groupby('Restaurant ID').apply(
-        lambda x: (x['Date de commande'].dt.normalize().drop_duplicates().sort_values().iloc[1] -
-                   x['Date de commande'].dt.normalize().drop_duplicates().sort_values().iloc[0]).days
-    ).reset_index()
-    
-    second_order_days.columns = ['Restaurant ID', 'Days to 2nd order']
-    
-    # Fusionner les données des clients multi-commande avec les jours jusqu'à la deuxième commande
-    multi_order_clients = multi_order_clients.merge(second_order_days, on='Restaurant ID', how='left')
+# Table de survie des clients ayant passé leur première commande entre le 1er janvier et le 1er juin 2024 :
+# les clients mono-achat sont censurés à la date de la dernière commande des données
+def load_second_order_clients(df):
+    df = with_datetime_columns(df[['Restaurant ID', 'Date de commande', 'date 1ere commande (Restaurant)']])
+    first_order_dates = df['date 1ere commande (Restaurant)']
+    clients = df[(first_order_dates >= pd.Timestamp('2024-01-01')) & (first_order_dates <= pd.Timestamp('2024-06-01'))]
+    
+    return survival_table(build_client_order_table(clients), cutoff=df['Date de commande'].max())
+
+# Même table à partir des agrégats par client (mode streaming) : la fin des données est la dernière commande
+# de tous les clients
+def second_order_clients_from_aggregates(aggregates):
+    first_order_dates = aggregates['date 1ere commande (Restaurant)']
+    clients = aggregates[(first_order_dates >= pd.Timestamp('2024-01-01')) & (first_order_dates <= pd.Timestamp('2024-06-01'))]
     
-    return multi_order_clients
+    return survival_table(clients, cutoff=aggregates['Dernière commande'].max())
 
 
 import plotly.graph_objects as go
 
-def plot_second_order_curve(base_clients, second_clients=None):
-    # Calculer les données cumulatives pour la base
-    total_base_clients = len(base_clients)
-    base_clients_60_days = base_clients[base_clients['Days to 2nd order'] <= 60]
-    cumulative_base = base_clients_60_days['Days to 2nd order'].value_counts().sort_index().cumsum() / total_base_clients * 100
-    
+@instrument()
+@memoize_figure
+def plot_second_order_curve(curves):
     # Créer le graphique interactif avec Plotly
     fig = go.Figure()
 
-    # Ajout de la courbe pour la base
-    fig.add_trace(go.Scatter(
-        x=cumulative_base.index,
-        y=cumulative_base.values,
-        mode='lines+markers',
-        marker=dict(size=8),
-        name="Base historique",
-        line=dict(color='royalblue', width=2)
-    ))
-    
-    # Si un deuxième ensemble de clients est fourni, ajouter une deuxième courbe
-    if second_clients is not None:
-        total_second_clients = len(second_clients)
-        second_clients_60_days = second_clients[second_clients['Days to 2nd order'] <= 60]
-        cumulative_second = second_clients_60_days['Days to 2nd order'].value_counts().sort_index().cumsum() / total_second_clients * 100
-        
-        fig.add_trace(go.Scatter(
-            x=cumulative_second.index,
-            y=cumulative_second.values,
+    # Une courbe par groupe (courbes de survival.second_order_curves) : base historique, puis cohorte éventuelle
+    colors = ['royalblue', 'orange', 'seagreen', 'crimson']
+    for idx, (group, curve) in enumerate(curves.groupby('Groupe', sort=False)):
+        fig.add_trace(line_trace(
+            curve['Jours'],
+            curve['% passés à la 2e commande'],
             mode='lines+markers',
             marker=dict(size=8),
-            name="Deuxième groupe (septembre par ex.)",
-            line=dict(color='orange', width=2)
+            line=dict(color=colors[idx % len(colors)], width=2, shape='hv'),
+            name=group,
+            customdata=curve['Clients observés'],
+            hovertemplate="%{y:.1f}% (%{customdata} clients encore observés)"
         ))
 
     # Ajouter le layout
@@ -158,7 +140,7 @@ def plot_second_order_curve(base_clients, second_clients=None):
         title="Pourcentage de clients passant à la deuxième commande",
         xaxis_title="Temps jusqu'à la deuxième commande (jours)",
         yaxis_title="% de clients passés à multi-achats",
-        xaxis=dict(tickmode='linear', dtick=5),
+        xaxis=dict(tickmode='linear', dtick=5) if curves['Jours'].max() <= 60 else dict(),
         yaxis=dict(range=[0, 100]),
         hovermode="x unified"
     )
@@ -0,0 +1,75 @@
+import argparse
+import logging
+import os
+
+import pandas as pd
+import streamlit.logger
+
+# Exécution sans serveur Streamlit (tâche planifiée) : les caches fonctionnent en mémoire, on masque les avertissements "bare mode"
+streamlit.logger.set_log_level(logging.ERROR)
+
+from artifacts import ARTIFACTS_DIR, SOURCE_PATH, cohort_artifact_name, write_artifacts
+from data_cache import file_digest
+from data_processing import download_files, refresh_data, load_prepared_data, load_client_aggregates, load_cohort_table, ingestion_mode
+from plot_data import plot_mono_vs_multi_order, load_second_order_clients, second_order_clients_from_aggregates, plot_second_order_curve
+from survival import second_order_curves
+from cohorte import build_cohort
+
+# Base historique par défaut des pages Septembre et Cohortes
+BASELINE = ('2024-01-01', '2024-06-30')
+
+
+# Cohortes précalculées par défaut : celle de la page Septembre et celle affichée à l'ouverture de la page Cohortes (dernier mois, FR)
+def default_cohorts():
+    if ingestion_mode == 'streaming':
+        last_first_order = load_client_aggregates()['date 1ere commande (Restaurant)'].max()
+    else:
+        last_first_order = load_prepared_data(['date 1ere commande (Restaurant)'])['date 1ere commande (Restaurant)'].max()
+    last_month = str(min(last_first_order, pd.Timestamp.today()).to_period('M'))
+    return [('2024-09', '2024-09', 'FR'), (last_month, last_month, 'FR')]
+
+
+# Calculer tous les résultats des pages (tables et figures) à partir des données téléchargées
+def compute_artifacts(cohorts):
+    artifacts = {'cohorts': load_cohort_table()}
+    artifacts['figure_mono_vs_multi_FR'] = plot_mono_vs_multi_order(artifacts['cohorts'], country='FR')
+
+    if ingestion_mode == 'streaming':
+        second_order_clients = second_order_clients_from_aggregates(load_client_aggregates())
+    else:
+        second_order_clients = load_second_order_clients(load_prepared_data())
+    artifacts['second_order_curves'] = second_order_curves({"Base historique": second_order_clients})
+    artifacts['figure_second_order'] = plot_second_order_curve(artifacts['second_order_curves'])
+
+    for start_month, end_month, country in cohorts:
+        name = cohort_artifact_name(start_month, end_month, country, *BASELINE)
+        artifacts[name] = build_cohort(start_month, end_month, country, *BASELINE)
+
+    return artifacts
+
+
+# Cohorte passée en ligne de commande sous la forme DEBUT:FIN:PAYS, par ex. 2024-09:2024-09:FR
+def parse_cohort(value):
+    start_month, end_month, country = value.split(':')
+    return start_month, end_month, country
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précalculer les tables et graphiques du tableau de bord (tâche planifiée)")
+    parser.add_argument('--refresh', action='store_true', help="Retélécharger les fichiers dont la révision distante a changé")
+    parser.add_argument('--cohort', type=parse_cohort, action='append', dest='cohorts', metavar='DEBUT:FIN:PAYS',
+                        help="Cohorte à précalculer (répétable ; par défaut : septembre 2024 et le dernier mois, FR)")
+    parser.add_argument('--keep', type=int, default=3, help="Nombre de versions d'artefacts conservées")
+    args = parser.parse_args()
+
+    download_files()
+    if args.refresh:
+        refresh_data()
+
+    artifacts = compute_artifacts(args.cohorts or default_cohorts())
+    version = write_artifacts(artifacts, file_digest(SOURCE_PATH), keep=args.keep)
+    print(f"{len(artifacts)} artefacts écrits dans {os.path.join(ARTIFACTS_DIR, version)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Groupes d'ancienneté (jours depuis la première commande) des pages de cohorte
+seniority_labels = ['0-5 jours', '5-10 jours', '10-15 jours', '15-20 jours', '> 20 jours']
+SENIORITY_BINS = [0, 5, 10, 15, 20, np.inf]
+
+# Stats par cohorte : version de la table des clients, jour de calcul, comptes par jour de première commande et stats par groupe
+STATS_CACHE_SIZE = 64
+_stats_cache = OrderedDict()
+_stats_cache_lock = threading.Lock()
+
+
+# Nombre de clients et de clients mono-achat par jour de première commande (une ligne par jour, quelques dizaines au plus)
+def first_order_day_counts(clients):
+    return pd.DataFrame({
+        'Jour 1ère commande': clients['date 1ere commande (Restaurant)'].dt.normalize().to_numpy(),
+        'Restaurant ID': 1,
+        'Jours avec commande': (clients['Jours avec commande'] == 1).astype('int64').to_numpy(),
+    }).groupby('Jour 1ère commande').sum()
+
+
+# Groupe d'ancienneté de chaque jour de première commande à une date donnée (mêmes bornes que pd.cut sur l'ancienneté)
+def seniority_buckets(first_order_days, day):
+    ages = (day - first_order_days).days.to_numpy()
+    return pd.cut(ages, bins=SENIORITY_BINS, labels=seniority_labels)
+
+
+# Clients (Restaurant ID) et clients mono-achat (Jours avec commande) par groupe d'ancienneté
+def bucket_stats(day_counts, buckets):
+    return day_counts.groupby(buckets, observed=False).sum().reindex(seniority_labels, fill_value=0)
+
+
+# Passage d'un jour au suivant : seuls les jours de première commande qui changent de groupe sont déplacés
+def roll_seniority_stats(stats, day_counts, previous_day, day):
+    previous_buckets = seniority_buckets(day_counts.index, previous_day)
+    buckets = seniority_buckets(day_counts.index, day)
+    moved = previous_buckets.codes != buckets.codes
+    if not moved.any():
+        return stats
+    return stats - bucket_stats(day_counts[moved], previous_buckets[moved]) + bucket_stats(day_counts[moved], buckets[moved])
+
+
+# Stats par groupe d'ancienneté d'une cohorte, mémoïsées sur (version de clients, jour) : recalculées depuis la table
+# par client quand elle change, décalées incrémentalement quand seul le jour change
+# La version identifie le contenu de clients lui-même (cohorte.compute_cohort : empreinte de la table), pas la version
+# courante du fichier source, qui peut changer pendant qu'une table plus ancienne est encore affichée
+def cohort_seniority_stats(key, clients, clients_version, day=None):
+    day = pd.Timestamp.today().normalize() if day is None else day
+    with _stats_cache_lock:
+        entry = _stats_cache.get(key)
+
+    if entry is not None and entry['version'] == clients_version and entry['day'] == day:
+        stats = entry['stats']
+    elif entry is not None and entry['version'] == clients_version:
+        stats = roll_seniority_stats(entry['stats'], entry['day_counts'], entry['day'], day)
+        entry = {**entry, 'day': day, 'stats': stats}
+    else:
+        day_counts = first_order_day_counts(clients)
+        stats = bucket_stats(day_counts, seniority_buckets(day_counts.index, day))
+        entry = {'version': clients_version, 'day': day, 'day_counts': day_counts, 'stats': stats}
+
+    with _stats_cache_lock:
+        _stats_cache[key] = entry
+        _stats_cache.move_to_end(key)
+        while len(_stats_cache) > STATS_CACHE_SIZE:
+            _stats_cache.popitem(last=False)
+
+    # Seuls les groupes ayant des clients sont affichés
+    seniority_stats = stats[stats['Restaurant ID'] > 0].rename_axis('Groupe ancienneté').reset_index()
+    seniority_stats['% Mono-order'] = (seniority_stats['Jours avec commande'] / seniority_stats['Restaurant ID']) * 100
+    return seniority_stats
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# Colonnes lues dans le CSV des commandes en mode streaming
+streaming_columns = ['Restaurant ID', 'Restaurant', 'Postal code', 'Pays', 'Date de commande', 'date 1ere commande (Restaurant)']
+first_value_columns = ['Restaurant', 'Postal code', 'Pays', 'date 1ere commande (Restaurant)']
+
+# Un jour de commande est codé sur 20 bits (jours depuis le 1er janvier 1900) à côté du code client : clé = code << 20 | jour
+DAY_BITS = 20
+DAY_ORIGIN = np.datetime64('1900-01-01', 'D').astype('int64')
+# Les clés (client, jour) de chaque bloc sont mises de côté puis dédupliquées ensemble au-delà de ce nombre
+COMPACT_KEYS = 10_000_000
+
+
+# Lire le CSV des commandes par blocs en appliquant les filtres de date et de pays pendant la lecture
+def read_order_chunks(path, start_date=None, end_date=None, countries=None, chunksize=500_000):
+    chunks = pd.read_csv(path, usecols=lambda column: column in streaming_columns,
+                         dtype={'Restaurant ID': 'string', 'Postal code': 'string'}, decimal='.', chunksize=chunksize)
+    for chunk in chunks:
+        chunk['Date de commande'] = pd.to_datetime(chunk['Date de commande'], errors='coerce')
+        mask = chunk['Date de commande'].notna() & chunk['Restaurant ID'].notna()
+        if start_date is not None:
+            mask &= chunk['Date de commande'] >= pd.Timestamp(start_date)
+        if end_date is not None:
+            mask &= chunk['Date de commande'] <= pd.Timestamp(end_date)
+        if countries is not None:
+            mask &= chunk['Pays'].isin(countries)
+        chunk = chunk[mask]
+        if len(chunk):
+            chunk['date 1ere commande (Restaurant)'] = pd.to_datetime(chunk['date 1ere commande (Restaurant)'], errors='coerce')
+            yield chunk
+
+
+# Valeurs distinctes triées d'un tableau d'entiers : un tri puis la suppression des doublons consécutifs (plus rapide que np.unique)
+def sorted_unique(values):
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+
+# Réduire un historique de commandes (itérable de blocs) aux agrégats par client, sans jamais garder les lignes brutes :
+# seuls les couples (client, jour de commande) distincts et la première valeur de chaque attribut client sont conservés.
+# Chaque bloc ne coûte que sa propre taille : les clés sont dédupliquées par bloc puis fusionnées par lots, et les
+# attributs ne sont relus que pour les clients nouveaux ou dont un attribut est encore vide
+def reduce_client_aggregates(chunks):
+    client_codes = {}
+    client_ids = []
+    key_runs, pending_keys, compacted_keys = [], 0, 0
+    first_parts = []
+    missing = np.ones((1024, len(first_value_columns)), dtype=bool)
+
+    for chunk in chunks:
+        # Codes clients stables d'un bloc à l'autre (table de hachage identifiant -> code)
+        chunk_codes, uniques = pd.factorize(chunk['Restaurant ID'])
+        uniques = uniques.tolist()
+        for client in uniques:
+            if client not in client_codes:
+                client_codes[client] = len(client_ids)
+                client_ids.append(client)
+        codes = np.fromiter((client_codes[client] for client in uniques), dtype='int64', count=len(uniques))[chunk_codes]
+        if len(client_ids) > len(missing):
+            missing = np.vstack([missing, np.ones((max(len(client_ids), 2 * len(missing)) - len(missing), missing.shape[1]), dtype=bool)])
+
+        # Couples (client, jour) distincts du bloc, fusionnés avec les précédents par lots
+        days = chunk['Date de commande'].dt.normalize().to_numpy().astype('datetime64[D]').astype('int64') - DAY_ORIGIN
+        if len(days) and (days.min() < 0 or days.max() >= 1 << DAY_BITS):
+            raise ValueError("Date de commande hors de la plage prise en charge (à partir du 1er janvier 1900)")
+        key_runs.append(sorted_unique((codes << DAY_BITS) | days))
+        pending_keys += len(key_runs[-1])
+        if pending_keys > max(COMPACT_KEYS, 2 * compacted_keys):
+            key_runs = [sorted_unique(np.concatenate(key_runs))]
+            pending_keys = compacted_keys = len(key_runs[0])
+
+        # Première valeur non vide de chaque attribut, dans l'ordre du fichier, pour les clients dont un attribut manque
+        needed = missing[codes].any(axis=1)
+        if needed.any():
+            chunk_first = chunk.loc[needed, first_value_columns].assign(code=codes[needed]).groupby('code', sort=False).first()
+            missing[chunk_first.index] &= chunk_first.isna().to_numpy()
+            first_parts.append(chunk_first)
+
+    keys = sorted_unique(np.concatenate(key_runs)) if key_runs else np.empty(0, dtype='int64')
+    client_index = pd.Index(client_ids, dtype='string')
+    if first_parts:
+        first = pd.concat(first_parts).groupby(level=0).first()
+    else:
+        first = pd.DataFrame(columns=first_value_columns)
+
+    # Les clés sont triées par client puis par jour : nombre de jours distincts, première, deuxième et dernière commande
+    key_codes = keys >> DAY_BITS
+    key_days = ((keys & ((1 << DAY_BITS) - 1)) + DAY_ORIGIN).astype('datetime64[D]').astype('datetime64[ns]')
+    codes, start, counts = np.unique(key_codes, return_index=True, return_counts=True)
+    second = np.where(counts > 1, start + 1, start)
+
+    aggregates = pd.DataFrame({
+        'Restaurant ID': client_index[codes],
+        'Jours avec commande': counts,
+        'Commande 1': key_days[start],
+        'Commande 2': np.where(counts > 1, key_days[second], np.datetime64('NaT')),
+        'Dernière commande': key_days[start + counts - 1],
+    })
+    aggregates['Days to 2nd order'] = (aggregates['Commande 2'] - aggregates['Commande 1']).dt.days
+    aggregates = pd.concat([aggregates, first.reindex(codes).reset_index(drop=True)], axis=1)
+
+    for column in ['Restaurant ID', 'Pays', 'Postal code']:
+        aggregates[column] = aggregates[column].astype('category')
+
+    return aggregates
+
+
+# Agrégats par client calculés en streaming à partir du CSV des commandes
+def stream_client_aggregates(path, start_date='2024-01-01', end_date=None, countries=None, chunksize=500_000):
+    return reduce_client_aggregates(read_order_chunks(path, start_date, end_date, countries, chunksize))
@@ -1,6 +1,8 @@
 import streamlit as st
-from plot_data import load_and_filter_data, plot_mono_vs_multi_order, load_multi_order_clients, plot_second_order_curve
-from data_processing import load_prepared_data
+from plot_data import plot_mono_vs_multi_order, load_second_order_clients, second_order_clients_from_aggregates, plot_second_order_curve
+from survival import second_order_curves
+from data_processing import load_prepared_data, load_cohort_table, load_client_aggregates, ingestion_mode
+from artifacts import load_artifact
 
 def main():
     st.title("Historique des clients")
@@ -9,21 +11,24 @@ def main():
     st.subheader("Graphique Mono vs Multi-Achats")
     st.write("Voici les infos sur le taux de mono-order des clients français.")
     
-    # Charger les données
-    df = load_prepared_data()
-
-    # Filtrer et afficher le graphique des clients mono vs multi-achat
-    clients_fr = load_and_filter_data(df)
-    fig_mono_vs_multi = plot_mono_vs_multi_order(clients_fr)
+    # Afficher le graphique des clients mono vs multi-achat : précalculé s'il est à jour, sinon à partir de la table des cohortes
+    fig_mono_vs_multi = load_artifact('figure_mono_vs_multi_FR')
+    if fig_mono_vs_multi is None:
+        fig_mono_vs_multi = plot_mono_vs_multi_order(load_cohort_table(), country='FR')
     st.plotly_chart(fig_mono_vs_multi)
     
     # Section deuxième commande
     st.subheader("Temps jusqu'à la deuxième commande")
     st.write("Temps nécessaire aux clients multi-catégories pour passer à leur deuxième commande (1er janvier - 1er juin 2024).")
     
-    # Filtrer les clients multi-commande et afficher la courbe du temps jusqu'à la deuxième commande
-    multi_order_clients = load_multi_order_clients(df)
-    fig_second_order_curve = plot_second_order_curve(multi_order_clients)
+    # Courbe du temps jusqu'à la deuxième commande (Kaplan–Meier : les clients mono-achat comptent jusqu'à la fin des données)
+    fig_second_order_curve = load_artifact('figure_second_order')
+    if fig_second_order_curve is None:
+        if ingestion_mode == 'streaming':
+            second_order_clients = second_order_clients_from_aggregates(load_client_aggregates())
+        else:
+            second_order_clients = load_second_order_clients(load_prepared_data())
+        fig_second_order_curve = plot_second_order_curve(second_order_curves({"Base historique": second_order_clients}))
     st.plotly_chart(fig_second_order_curve)
 
 if __name__ == "__main__":
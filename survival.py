@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+
+# Table de survie par client à partir d'une table par client (build_client_order_table ou agrégats du mode streaming) :
+# jours jusqu'à la deuxième commande pour les clients multi-achats, sinon jours d'observation entre la première
+# commande et la date de fin des données (client censuré à droite)
+def survival_table(order_table, cutoff):
+    reordered = order_table['Jours avec commande'] > 1
+    observed_days = (pd.Timestamp(cutoff).normalize() - order_table['Commande 1']).dt.days
+    return pd.DataFrame({
+        'Restaurant ID': order_table['Restaurant ID'],
+        'Jours observés': order_table['Days to 2nd order'].where(reordered, observed_days).astype('int64'),
+        '2e commande': reordered.to_numpy(),
+    }).reset_index(drop=True)
+
+
+# Estimateur de Kaplan–Meier du passage à la deuxième commande, pour tous les groupes en une passe :
+# un tri (groupe, jours) puis des sommes par segment. Retourne une ligne par (groupe, jour avec au moins une deuxième
+# commande), dans l'ordre d'apparition des groupes, avec la part cumulée de clients passés à la deuxième commande.
+# weights donne le nombre de clients de chaque ligne (tables déjà comptées par jour), un client par ligne par défaut
+def kaplan_meier(durations, events, groups, weights=None):
+    durations = np.asarray(durations, dtype='int64')
+    events = np.asarray(events, dtype=bool)
+    weights = np.ones(len(durations), dtype='int64') if weights is None else np.asarray(weights, dtype='int64')
+    group_codes, group_labels = pd.factorize(np.asarray(groups), sort=False)
+
+    order = np.lexsort((durations, group_codes))
+    codes, days, clients = group_codes[order], durations[order], weights[order]
+    reorders = np.where(events[order], clients, 0)
+
+    # Un segment par couple (groupe, jour) : deuxièmes commandes du jour et clients encore observés ce jour-là
+    # (clients du segment et des jours suivants du même groupe)
+    boundaries = np.ones(len(days), dtype=bool)
+    boundaries[1:] = (codes[1:] != codes[:-1]) | (days[1:] != days[:-1])
+    starts = np.flatnonzero(boundaries)
+    segment_codes = codes[starts]
+    reorders_per_day = np.add.reduceat(reorders, starts) if len(starts) else np.empty(0, dtype='int64')
+    cumulated_clients = np.concatenate([[0], np.cumsum(clients)])
+    group_stops = np.searchsorted(codes, np.arange(len(group_labels)), side='right')
+    at_risk = cumulated_clients[group_stops[segment_codes]] - cumulated_clients[starts]
+
+    curves = pd.DataFrame({
+        'Groupe': group_labels[segment_codes],
+        'Jours': days[starts],
+        'Clients observés': at_risk,
+        'Clients passés à la 2e commande': reorders_per_day,
+    })
+    survival = pd.Series(1 - reorders_per_day / at_risk).groupby(segment_codes).cumprod()
+    curves['% passés à la 2e commande'] = (1 - survival.to_numpy()) * 100
+
+    return curves[curves['Clients passés à la 2e commande'] > 0].reset_index(drop=True)
+
+
+# Courbes de plusieurs groupes de clients ({nom du groupe: table de survie}) calculées ensemble
+def second_order_curves(groups):
+    tables = pd.concat([table.assign(Groupe=name) for name, table in groups.items()], ignore_index=True)
+    return kaplan_meier(tables['Jours observés'], tables['2e commande'], tables['Groupe'])
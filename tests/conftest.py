@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+# Les modules de l'application sont à la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit.logger
+
+# Exécution sans serveur Streamlit : les caches fonctionnent en mémoire, on masque les avertissements "bare mode"
+streamlit.logger.set_log_level(logging.ERROR)
+
+
+# Serveur HTTP local de fichiers en mémoire : ETag, Content-MD5, requêtes partielles (Range, If-Range),
+# réponses coupées après un nombre d'octets et sommes de contrôle falsifiées pour simuler les incidents
+class SourceServer:
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        self.truncate = {}
+        self.bad_md5 = set()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, name):
+        return f'http://127.0.0.1:{self.httpd.server_port}/{name}'
+
+    # Requêtes GET reçues pour un fichier ({'range', 'if_range'})
+    def gets(self, name):
+        return [request for request in self.requests if request['method'] == 'GET' and request['name'] == name]
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.respond(body=False)
+
+            def do_GET(self):
+                self.respond(body=True)
+
+            def respond(self, body):
+                name = self.path.lstrip('/')
+                server.requests.append({'method': self.command, 'name': name,
+                                        'range': self.headers.get('Range'), 'if_range': self.headers.get('If-Range')})
+                if name not in server.files:
+                    self.send_error(404)
+                    return
+                data = server.files[name]
+                etag = f'"{hashlib.md5(data).hexdigest()}"'
+
+                # La suite n'est renvoyée que si le validateur correspond au contenu actuel, sinon le contenu complet
+                start = 0
+                requested = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+                if requested and self.headers.get('If-Range', etag) == etag:
+                    start = int(requested.group(1))
+                    if start >= len(data):
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{len(data)}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+                else:
+                    md5 = hashlib.md5(b'falsifie' if name in server.bad_md5 else data).digest()
+                    self.send_response(200)
+                    self.send_header('Content-MD5', base64.b64encode(md5).decode())
+                self.send_header('Content-Length', str(len(data) - start))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                if not body:
+                    return
+
+                # Réponse coupée : la connexion est fermée après le nombre d'octets demandé
+                limit = server.truncate.get(name)
+                if limit is not None:
+                    self.wfile.write(data[start:start + limit])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(data[start:])
+
+        return Handler
+
+
+@pytest.fixture
+def source_server():
+    server = SourceServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+# Répertoire de travail temporaire (les chemins de l'application sont relatifs : 'data/...'), nouvelles tentatives
+# immédiates et petits blocs pour qu'une réponse coupée laisse un fichier partiel
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    import data_refresh
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(data_refresh, 'RETRY_DELAY', 0)
+    monkeypatch.setattr(data_refresh, 'CHUNK_SIZE', 256)
+    os.makedirs('data')
+    return tmp_path
+
+
+# Commandes de l'exemple de la revue : 10 clients mono-achat le 10 janvier, 5 clients commandant les 5 janvier,
+# 1er février et 1er décembre (la dernière commande des données n'est la première ni la deuxième de personne)
+@pytest.fixture
+def review_orders():
+    rows = [(f'M{client}', '2024-01-10', '2024-01-10') for client in range(10)]
+    rows += [(f'R{client}', day, '2024-01-05') for client in range(5) for day in ['2024-01-05', '2024-02-01', '2024-12-01']]
+    orders = pd.DataFrame(rows, columns=['Restaurant ID', 'Date de commande', 'date 1ere commande (Restaurant)'])
+    orders['Restaurant ID'] = orders['Restaurant ID'].astype('string')
+    orders['Restaurant'] = orders['Restaurant ID']
+    orders['Postal code'] = pd.Series('75001', index=orders.index, dtype='string')
+    orders['Pays'] = 'FR'
+    for column in ['Date de commande', 'date 1ere commande (Restaurant)']:
+        orders[column] = pd.to_datetime(orders[column])
+    return orders
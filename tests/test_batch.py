@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from batch import empty_curves, run_batch
+from streaming import reduce_client_aggregates
+
+
+def test_streaming_batch_matches_memory(review_orders):
+    memory = run_batch(review_orders, workers=1)
+    streaming = run_batch(reduce_client_aggregates([review_orders]), workers=1, from_aggregates=True)
+
+    pd.testing.assert_frame_equal(memory, streaming)
+    assert np.isclose(memory['% passés à la 2e commande'].iloc[-1], 100 / 3)
+
+
+def test_hash_partitions_match_country_partition(review_orders):
+    by_country = run_batch(review_orders, workers=1)
+    by_hash = run_batch(review_orders, partition='hash', partitions=3, workers=2)
+
+    pd.testing.assert_frame_equal(by_country, by_hash)
+
+
+def test_empty_batch_returns_empty_curves(review_orders):
+    pd.testing.assert_frame_equal(run_batch(review_orders.iloc[:0], workers=1), empty_curves())
+    pd.testing.assert_frame_equal(run_batch(reduce_client_aggregates([]), workers=1, from_aggregates=True), empty_curves())
+
+    # Commandes sans client dans une cohorte : aucune courbe à calculer
+    before_cohorts = review_orders.assign(**{'date 1ere commande (Restaurant)': pd.Timestamp('2000-01-01')})
+    pd.testing.assert_frame_equal(run_batch(before_cohorts, workers=1), empty_curves())
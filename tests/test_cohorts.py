@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from cohorts import build_cohort_table, update_cohort_table
+from plot_data import plot_mono_vs_multi_order
+
+
+# Commandes 2024 de clients français et belges : première commande du client, puis des commandes jusqu'à 90 jours après
+def random_orders(n_clients=60, seed=0):
+    rng = np.random.default_rng(seed)
+    first_days = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 150, n_clients), unit='D')
+    rows = []
+    for client, first_day in enumerate(first_days):
+        country = 'FR' if client % 3 else 'BE'
+        for delay in [0, *sorted(rng.integers(0, 90, rng.integers(0, 4)))]:
+            rows.append((f'R{client}', country, first_day + pd.Timedelta(days=int(delay)), first_day))
+    return orders_frame(rows)
+
+
+def orders_frame(rows):
+    orders = pd.DataFrame(rows, columns=['Restaurant ID', 'Pays', 'Date de commande', 'date 1ere commande (Restaurant)'])
+    orders['Restaurant ID'] = orders['Restaurant ID'].astype('string')
+    orders['Pays'] = orders['Pays'].astype('category')
+    return orders
+
+
+# Table des cohortes comparable d'une construction à l'autre (pays en chaînes)
+def comparable(cohorts):
+    return cohorts.assign(Pays=cohorts['Pays'].astype(str)).sort_values(['Pays', 'Mois 1ère commande'], ignore_index=True)
+
+
+def test_update_matches_full_rebuild():
+    orders = random_orders()
+    cohorts = build_cohort_table(orders)
+
+    # Nouvelles commandes : deuxièmes commandes de clients existants (dont un client mono-achat), un nouveau client
+    # dans une cohorte existante et un nouveau client dans un nouveau pays
+    counts = orders['Restaurant ID'].value_counts()
+    mono = orders[orders['Restaurant ID'] == counts.index[counts == 1][0]].iloc[0]
+    first = orders.iloc[0]
+    new_orders = orders_frame([
+        (mono['Restaurant ID'], mono['Pays'], mono['Date de commande'] + pd.Timedelta(days=70), mono['date 1ere commande (Restaurant)']),
+        (first['Restaurant ID'], first['Pays'], pd.Timestamp('2024-07-01'), first['date 1ere commande (Restaurant)']),
+        ('N1', 'FR', pd.Timestamp('2024-03-15'), pd.Timestamp('2024-03-15')),
+        ('N2', 'DE', pd.Timestamp('2024-06-20'), pd.Timestamp('2024-06-20')),
+    ])
+    df = pd.concat([orders, new_orders], ignore_index=True).astype({'Pays': 'category'})
+
+    updated = update_cohort_table(cohorts, df, new_orders)
+    pd.testing.assert_frame_equal(comparable(updated), comparable(build_cohort_table(df)))
+    assert not comparable(updated).equals(comparable(cohorts))
+
+
+def test_mono_vs_multi_title_names_the_country():
+    cohorts = build_cohort_table(random_orders())
+    for country in ['FR', 'BE']:
+        fig = plot_mono_vs_multi_order(cohorts, country=country)
+        assert f'({country})' in fig.layout.title.text
+        assert 'France' not in fig.layout.title.text
@@ -0,0 +1,204 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data_processing
+import data_refresh
+from data_cache import latest_cache, read_parquet
+
+PREPARED_CSV = (
+    'Restaurant ID,Restaurant,Postal code,Pays,Date de commande,date 1ere commande (Restaurant)\n'
+    'R1,Chez Paul,75001,FR,2024-03-01,2024-03-01\n'
+    'R1,Chez Paul,75001,FR,2024-03-05,2024-03-01\n'
+    'R2,Da Mario,1000,BE,2024-04-02,2024-04-02\n'
+)
+
+
+NEW_ORDERS_CSV = (
+    'R2,Da Mario,1000,BE,2024-04-09,2024-04-02\n'
+    'R3,Le Zinc,69002,FR,2024-04-10,2024-04-10\n'
+)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# Contenu de test : octets reconnaissables d'une version du fichier
+def content(version, size):
+    return (f'version {version} '.encode() * size)[:size]
+
+
+# Aucun reste d'un transfert : ni fichier partiel, ni état, ni fichier partiel de gdown
+def leftovers(output):
+    directory, name = os.path.split(output)
+    return [filename for filename in os.listdir(directory) if filename.startswith(f'{name}.part')]
+
+
+def test_refresh_skips_unchanged_revision(source_server, workdir, monkeypatch):
+    source_server.files['prepared_data.csv'] = PREPARED_CSV.encode()
+    source_server.files['google_sheets_data.xlsx'] = content(1, 500)
+    monkeypatch.setattr(data_processing, 'prepared_data_url', source_server.url('prepared_data.csv'))
+    monkeypatch.setattr(data_processing, 'google_sheets_url', source_server.url('google_sheets_data.xlsx'))
+
+    assert sorted(data_processing.refresh_data()) == ['google_sheets_data.xlsx', 'prepared_data.csv']
+    assert len(source_server.gets('prepared_data.csv')) == 1
+    assert len(source_server.gets('google_sheets_data.xlsx')) == 1
+
+    # Révisions inchangées : seules les requêtes HEAD sont envoyées
+    assert data_processing.refresh_data() == []
+    assert len(source_server.gets('prepared_data.csv')) == 1
+    assert len(source_server.gets('google_sheets_data.xlsx')) == 1
+
+    # Seul le fichier dont la révision a changé est retéléchargé
+    source_server.files['google_sheets_data.xlsx'] = content(2, 500)
+    assert data_processing.refresh_data() == ['google_sheets_data.xlsx']
+    assert len(source_server.gets('prepared_data.csv')) == 1
+    assert len(source_server.gets('google_sheets_data.xlsx')) == 2
+    assert read(os.path.join('data', 'google_sheets_data.xlsx')) == content(2, 500)
+
+
+# Cache d'un fichier source factice : compte ses invalidations
+class FakeCache:
+    def __init__(self):
+        self.clears = 0
+
+    def clear(self):
+        self.clears += 1
+
+
+def serve_sources(source_server, monkeypatch):
+    source_server.files['prepared_data.csv'] = PREPARED_CSV.encode()
+    source_server.files['google_sheets_data.xlsx'] = content(1, 500)
+    monkeypatch.setattr(data_processing, 'prepared_data_url', source_server.url('prepared_data.csv'))
+    monkeypatch.setattr(data_processing, 'google_sheets_url', source_server.url('google_sheets_data.xlsx'))
+
+
+def test_refresh_appends_only_new_orders(source_server, workdir, monkeypatch):
+    serve_sources(source_server, monkeypatch)
+    data_processing.refresh_data()
+
+    reads = []
+    read_prepared_csv = data_processing.read_prepared_csv
+
+    def recorded_read(path, after=None):
+        reads.append(after)
+        return read_prepared_csv(path, after)
+
+    monkeypatch.setattr(data_processing, 'read_prepared_csv', recorded_read)
+    source_server.files['prepared_data.csv'] = (PREPARED_CSV + NEW_ORDERS_CSV).encode()
+    assert data_processing.refresh_data() == ['prepared_data.csv']
+
+    # Seules les commandes postérieures à la dernière date en cache sont relues et ajoutées au cache
+    assert reads == [pd.Timestamp('2024-04-02')]
+    cached = read_parquet(latest_cache('prepared_data'))
+    assert len(cached) == 5
+    assert list(cached['Restaurant ID'].astype(str)) == ['R1', 'R1', 'R2', 'R2', 'R3']
+    assert isinstance(cached['Pays'].dtype, pd.CategoricalDtype)
+
+
+def test_refresh_clears_only_dependent_caches(source_server, workdir, monkeypatch):
+    serve_sources(source_server, monkeypatch)
+    data_processing.refresh_data()
+
+    orders_cache, sheets_cache = FakeCache(), FakeCache()
+    monkeypatch.setitem(data_processing.dependent_caches, 'prepared_data.csv', [orders_cache])
+    monkeypatch.setitem(data_processing.dependent_caches, 'google_sheets_data.xlsx', [sheets_cache])
+    source_server.files['google_sheets_data.xlsx'] = content(2, 500)
+    assert data_processing.refresh_data() == ['google_sheets_data.xlsx']
+
+    assert (orders_cache.clears, sheets_cache.clears) == (0, 1)
+
+
+def test_interrupted_transfer_resumes(source_server, workdir, monkeypatch):
+    monkeypatch.setattr(data_refresh, 'MAX_ATTEMPTS', 1)
+    source_server.files['orders.csv'] = content(1, 5000)
+    source_server.truncate['orders.csv'] = 2048
+    output = os.path.join('data', 'orders.csv')
+
+    with pytest.raises(IOError):
+        data_refresh.fetch_atomic(source_server.url('orders.csv'), output)
+    assert not os.path.exists(output)
+    assert os.path.getsize(f'{output}.part') == 2048
+
+    del source_server.truncate['orders.csv']
+    assert data_refresh.fetch_atomic(source_server.url('orders.csv'), output) is True
+
+    resumed = source_server.gets('orders.csv')[-1]
+    assert resumed['range'] == 'bytes=2048-'
+    assert resumed['if_range'] is not None
+    assert read(output) == content(1, 5000)
+    assert leftovers(output) == []
+
+
+def test_partial_of_previous_revision_is_discarded(source_server, workdir, monkeypatch):
+    monkeypatch.setattr(data_refresh, 'MAX_ATTEMPTS', 1)
+    source_server.files['orders.csv'] = content(1, 2000)
+    source_server.truncate['orders.csv'] = 1024
+    output = os.path.join('data', 'orders.csv')
+
+    with pytest.raises(IOError):
+        data_refresh.fetch_atomic(source_server.url('orders.csv'), output)
+    assert os.path.getsize(f'{output}.part') == 1024
+
+    # Nouvelle révision entre les deux tentatives : le fichier partiel n'est pas complété avec le nouveau contenu
+    source_server.files['orders.csv'] = content(2, 5000)
+    del source_server.truncate['orders.csv']
+    assert data_refresh.fetch_atomic(source_server.url('orders.csv'), output) is True
+
+    assert source_server.gets('orders.csv')[-1]['range'] is None
+    assert read(output) == content(2, 5000)
+    assert leftovers(output) == []
+
+
+def test_changed_content_restarts_despite_matching_revision(source_server, workdir):
+    # Contenu modifié entre la requête HEAD et la reprise : le serveur ignore Range (If-Range différent) et renvoie
+    # le nouveau contenu complet, qui remplace le fichier partiel au lieu d'y être ajouté
+    source_server.files['orders.csv'] = content(2, 5000)
+    output = os.path.join('data', 'orders.csv')
+    part_path = f'{output}.part'
+    with open(part_path, 'wb') as f:
+        f.write(content(1, 1000))
+    revision = data_refresh.remote_revision(source_server.url('orders.csv'))
+    data_refresh.save_part_state(part_path, {'revision': revision, 'validator': '"ancienne-version"', 'size': 2000, 'checksums': {}})
+
+    assert data_refresh.fetch_atomic(source_server.url('orders.csv'), output) is True
+
+    request = source_server.gets('orders.csv')[-1]
+    assert request['range'] == 'bytes=1000-'
+    assert request['if_range'] == '"ancienne-version"'
+    assert read(output) == content(2, 5000)
+
+
+def test_checksum_mismatch_discards_partial_and_keeps_file(source_server, workdir, monkeypatch):
+    monkeypatch.setattr(data_refresh, 'MAX_ATTEMPTS', 1)
+    source_server.files['orders.csv'] = content(2, 5000)
+    source_server.bad_md5.add('orders.csv')
+    output = os.path.join('data', 'orders.csv')
+    with open(output, 'wb') as f:
+        f.write(content(1, 3000))
+
+    with pytest.raises(ValueError):
+        data_refresh.fetch_atomic(source_server.url('orders.csv'), output)
+
+    assert leftovers(output) == []
+    assert read(output) == content(1, 3000)
+
+
+def test_failed_download_keeps_previous_file(source_server, workdir, monkeypatch):
+    monkeypatch.setattr(data_refresh, 'MAX_ATTEMPTS', 2)
+    source_server.files['orders.csv'] = content(2, 5000)
+    source_server.truncate['orders.csv'] = 1024
+    output = os.path.join('data', 'orders.csv')
+    with open(output, 'wb') as f:
+        f.write(content(1, 3000))
+
+    with pytest.raises(IOError):
+        data_refresh.fetch_atomic(source_server.url('orders.csv'), output)
+
+    # Deux tentatives, la seconde reprise après la première partie reçue ; le fichier en place est intact
+    assert [request['range'] for request in source_server.gets('orders.csv')] == [None, 'bytes=1024-']
+    assert read(output) == content(1, 3000)
+    assert data_refresh.download_status()[output]['status'] == 'échec'
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import seniority
+from plot_data import fingerprint
+from seniority import bucket_stats, cohort_seniority_stats, first_order_day_counts, roll_seniority_stats, seniority_buckets
+
+
+@pytest.fixture(autouse=True)
+def stats_cache(monkeypatch):
+    monkeypatch.setattr(seniority, '_stats_cache', OrderedDict())
+
+
+# Clients d'une cohorte : premières commandes réparties sur un mois, un client sur trois mono-achat
+def cohort_clients(n_clients, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Restaurant ID': [f'R{client}' for client in range(n_clients)],
+        'date 1ere commande (Restaurant)': pd.Timestamp('2024-03-01') + pd.to_timedelta(rng.integers(0, 31, n_clients), unit='D')
+                                           + pd.to_timedelta(rng.integers(0, 24, n_clients), unit='h'),
+        'Jours avec commande': np.where(np.arange(n_clients) % 3 == 0, 1, 2),
+    })
+
+
+# Stats attendues recalculées client par client, comme avant la mémoïsation
+def recomputed_stats(clients, day):
+    ages = (day - clients['date 1ere commande (Restaurant)'].dt.normalize()).dt.days
+    groups = pd.cut(ages, bins=seniority.SENIORITY_BINS, labels=seniority.seniority_labels)
+    stats = pd.DataFrame({'Restaurant ID': 1, 'Jours avec commande': (clients['Jours avec commande'] == 1).astype('int64')})
+    return stats.groupby(groups, observed=False).sum().reindex(seniority.seniority_labels, fill_value=0)
+
+
+def test_rollover_matches_recompute_across_bucket_boundaries():
+    clients = cohort_clients(200)
+    day_counts = first_order_day_counts(clients)
+    day = pd.Timestamp('2024-03-01')
+    stats = bucket_stats(day_counts, seniority_buckets(day_counts.index, day))
+
+    # Chaque jour, des jours de première commande franchissent les bornes 5, 10, 15 et 20 jours
+    for _ in range(60):
+        next_day = day + pd.Timedelta(days=1)
+        stats = roll_seniority_stats(stats, day_counts, day, next_day)
+        day = next_day
+        pd.testing.assert_frame_equal(stats, recomputed_stats(clients, day), check_names=False)
+
+
+def test_memoized_stats_roll_to_the_next_day():
+    clients = cohort_clients(200)
+    version = fingerprint(clients)
+    for day in pd.date_range('2024-03-10', '2024-04-10'):
+        stats = cohort_seniority_stats('cohorte', clients, version, day=day)
+        expected = recomputed_stats(clients, day)
+        expected = expected[expected['Restaurant ID'] > 0]
+        assert stats['Restaurant ID'].tolist() == expected['Restaurant ID'].tolist()
+        assert stats['Jours avec commande'].tolist() == expected['Jours avec commande'].tolist()
+
+
+def test_new_client_table_is_not_served_stale_stats():
+    day = pd.Timestamp('2024-04-15')
+    before, after = cohort_clients(93), cohort_clients(5, seed=1)
+
+    assert cohort_seniority_stats('cohorte', before, fingerprint(before), day=day)['Restaurant ID'].sum() == 93
+    # Table recalculée (par ex. pendant un rafraîchissement) : sa version est la sienne, les stats sont recalculées
+    assert cohort_seniority_stats('cohorte', after, fingerprint(after), day=day)['Restaurant ID'].sum() == 5
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import streaming
+from order_days import build_client_order_table
+from streaming import first_value_columns, reduce_client_aggregates
+
+
+# Commandes aléatoires, plusieurs par jour et par client, dans le désordre, dont des dates antérieures à 1970
+def random_orders(n_orders=500, n_clients=40, seed=0):
+    rng = np.random.default_rng(seed)
+    clients = rng.integers(0, n_clients, n_orders)
+    days = np.where(rng.random(n_orders) < 0.1, rng.integers(-20_000, 0, n_orders), rng.integers(19_700, 19_760, n_orders))
+    orders = pd.DataFrame({
+        'Restaurant ID': pd.Series([f'R{client}' for client in clients], dtype='string'),
+        'Restaurant': pd.Series([f'Restaurant {client}' for client in clients], dtype='string'),
+        'Postal code': pd.Series([f'{75000 + client % 20}' for client in clients], dtype='string'),
+        'Pays': np.where(clients % 2 == 0, 'FR', 'BE'),
+        'Date de commande': pd.to_datetime(days, unit='D') + pd.to_timedelta(rng.integers(0, 86_400, n_orders), unit='s'),
+    })
+    orders['date 1ere commande (Restaurant)'] = orders.groupby('Restaurant ID')['Date de commande'].transform('min').dt.normalize()
+    # Attributs parfois vides : la première valeur non vide du fichier est retenue
+    orders.loc[rng.random(n_orders) < 0.2, 'Postal code'] = pd.NA
+    return orders
+
+
+# Blocs de lecture successifs d'un historique de commandes
+def chunks(orders, size):
+    return (orders.iloc[start:start + size] for start in range(0, len(orders), size))
+
+
+@pytest.mark.parametrize('chunk_size', [7, 100, 1000])
+def test_streaming_aggregates_match_order_table(monkeypatch, chunk_size):
+    # Fusion fréquente des clés des blocs
+    monkeypatch.setattr(streaming, 'COMPACT_KEYS', 20)
+    orders = random_orders()
+    aggregates = reduce_client_aggregates(chunks(orders, chunk_size))
+    aggregates = aggregates.assign(**{'Restaurant ID': aggregates['Restaurant ID'].astype('string')})
+    aggregates = aggregates.sort_values('Restaurant ID', ignore_index=True)
+
+    expected = build_client_order_table(orders).sort_values('Restaurant ID', ignore_index=True)
+    pd.testing.assert_frame_equal(aggregates[expected.columns], expected, check_dtype=False)
+
+    by_client = orders.groupby('Restaurant ID').agg(**{'Dernière commande': ('Date de commande', 'max')})
+    assert (aggregates['Dernière commande'].to_numpy() == by_client['Dernière commande'].dt.normalize().to_numpy()).all()
+
+    first = orders.groupby('Restaurant ID')[first_value_columns].first().reset_index(drop=True)
+    pd.testing.assert_frame_equal(aggregates[first_value_columns].astype(first.dtypes.to_dict()), first)
+
+
+def test_orders_before_1900_are_rejected():
+    orders = random_orders(n_orders=20)
+    orders.loc[3, 'Date de commande'] = pd.Timestamp('1899-12-31')
+    with pytest.raises(ValueError):
+        reduce_client_aggregates(chunks(orders, 7))
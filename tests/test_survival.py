@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from plot_data import load_second_order_clients, second_order_clients_from_aggregates
+from streaming import reduce_client_aggregates
+from survival import kaplan_meier
+
+
+# Table de survie triée par client, identifiants en chaînes (catégories en mode streaming)
+def by_client(table):
+    table = table.assign(**{'Restaurant ID': table['Restaurant ID'].astype(str)})
+    return table.sort_values('Restaurant ID', ignore_index=True)
+
+
+def test_streaming_survival_table_matches_memory(review_orders):
+    memory = by_client(load_second_order_clients(review_orders))
+    streaming = by_client(second_order_clients_from_aggregates(reduce_client_aggregates([review_orders])))
+
+    # Les clients mono-achat sont observés jusqu'à la dernière commande des données (1er décembre)
+    assert memory.loc[memory['Restaurant ID'] == 'M0', 'Jours observés'].item() == 326
+    pd.testing.assert_frame_equal(memory, streaming)
+
+    curve = kaplan_meier(streaming['Jours observés'], streaming['2e commande'], ['Base'] * len(streaming))
+    assert np.isclose(curve['% passés à la 2e commande'].iloc[-1], 100 / 3)
+
+
+# Kaplan–Meier client par client : pour chaque groupe et chaque jour avec une deuxième commande, clients encore
+# observés (durée >= jour) et clients passés à la deuxième commande ce jour-là
+def naive_kaplan_meier(durations, events, groups, weights):
+    rows = []
+    for group in dict.fromkeys(groups):
+        members = [i for i in range(len(groups)) if groups[i] == group]
+        survival = 1.0
+        for day in sorted({durations[i] for i in members if events[i]}):
+            at_risk = sum(weights[i] for i in members if durations[i] >= day)
+            reorders = sum(weights[i] for i in members if durations[i] == day and events[i])
+            survival *= 1 - reorders / at_risk
+            rows.append((group, day, at_risk, reorders, (1 - survival) * 100))
+    return rows
+
+
+def test_kaplan_meier_matches_naive_loop():
+    rng = np.random.default_rng(0)
+    # Durées courtes pour de nombreux ex aequo, un client sur deux censuré, poids de clients déjà comptés
+    durations = rng.integers(0, 15, 300)
+    events = rng.random(300) < 0.5
+    groups = rng.choice(['FR', 'BE', 'DE'], 300)
+    weights = rng.integers(1, 5, 300)
+
+    curves = kaplan_meier(durations, events, groups, weights=weights)
+    expected = naive_kaplan_meier(durations.tolist(), events.tolist(), groups.tolist(), weights.tolist())
+
+    assert len(curves) == len(expected)
+    for row, (group, day, at_risk, reorders, percent) in zip(curves.itertuples(index=False), expected):
+        assert (row[0], row[1], row[2], row[3]) == (group, day, at_risk, reorders)
+        assert np.isclose(row[4], percent)
+
+    # Sans poids, un client par ligne
+    unweighted = kaplan_meier(durations, events, groups)
+    expected = naive_kaplan_meier(durations.tolist(), events.tolist(), groups.tolist(), [1] * 300)
+    assert unweighted['Clients observés'].tolist() == [row[2] for row in expected]
+    assert np.allclose(unweighted['% passés à la 2e commande'], [row[4] for row in expected])